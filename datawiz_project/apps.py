@@ -0,0 +1,31 @@
+from django.apps import AppConfig, apps
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+
+# models whose tables carry version stamps used for conditional requests
+VERSIONED_MODELS = (
+    "products.Category",
+    "products.Producer",
+    "products.Product",
+    "shops.ShopGroup",
+    "shops.Shop",
+    "receipts.Supplier",
+    "receipts.Terminal",
+)
+
+
+class DatawizProjectConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "datawiz_project"
+
+    def ready(self):
+        from datawiz_project.tenants import connection_created_handler
+        from datawiz_project.versions import bump_model_version
+
+        # connections are opened with search_path of the current tenant
+        connection_created.connect(connection_created_handler, dispatch_uid="tenant_search_path")
+
+        for model_name in VERSIONED_MODELS:
+            model = apps.get_model(model_name)
+            post_save.connect(bump_model_version, sender=model, dispatch_uid=f"bump_version_save_{model_name}")
+            post_delete.connect(bump_model_version, sender=model, dispatch_uid=f"bump_version_delete_{model_name}")
@@ -0,0 +1,71 @@
+"""
+Model fields storing fixed precision decimals as integer numbers of minor units (e.g. cents).
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core import checks
+from django.db import models
+
+# maximal absolute number of minor units stored in MinorUnitsField (PostgreSQL integer)
+MAX_MINOR_UNITS = 2**31 - 1
+
+
+def max_value(decimal_places):
+    """
+    Maximal absolute decimal value of MinorUnitsField with given decimal places
+    """
+    return Decimal(MAX_MINOR_UNITS).scaleb(-decimal_places)
+
+
+def to_minor_units(value, decimal_places):
+    """
+    Converts decimal (or float / string) value to integer number of minor units, half is rounded away from zero
+    """
+    if value is None:
+        return None
+    value = value if isinstance(value, Decimal) else Decimal(str(value))
+    return int(value.scaleb(decimal_places).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+class MinorUnitsMixin:
+    """
+    Value is Decimal with "decimal_places" digits after the point in Python and integer in database, so it takes
+    4 (or 8) bytes, is aggregated with integer arithmetic and sums are exact. Raw SQL has to divide sums by
+    10 ** decimal_places itself.
+    """
+
+    def __init__(self, *args, decimal_places=2, **kwargs):
+        self.decimal_places = decimal_places
+        super().__init__(*args, **kwargs)
+
+    def check(self, **kwargs):
+        errors = super().check(**kwargs)
+        if not isinstance(self.decimal_places, int) or self.decimal_places < 0:
+            errors.append(checks.Error("'decimal_places' must be a non-negative integer.", obj=self))
+        return errors
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["decimal_places"] = self.decimal_places
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else Decimal(value).scaleb(-self.decimal_places)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        return Decimal(str(value)).quantize(Decimal(1).scaleb(-self.decimal_places), rounding=ROUND_HALF_UP)
+
+    def get_prep_value(self, value):
+        if hasattr(value, "resolve_expression"):
+            return value
+        return to_minor_units(value, self.decimal_places)
+
+
+class MinorUnitsField(MinorUnitsMixin, models.IntegerField):
+    pass
+
+
+class BigMinorUnitsField(MinorUnitsMixin, models.BigIntegerField):
+    pass
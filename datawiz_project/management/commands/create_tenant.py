@@ -0,0 +1,36 @@
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from datawiz_project.models import Tenant
+from datawiz_project.tenants import (PUBLIC_SCHEMA, TENANTS_CACHE_KEY,
+                                     migrate_schema)
+
+
+class Command(BaseCommand):
+    help = "Creates tenant with its own schema and applies migrations of TENANT_APPS to the schema"
+
+    def add_arguments(self, parser):
+        parser.add_argument("slug", help="Name of the tenant in requests (header or subdomain)")
+        parser.add_argument("--name", help="Display name of the tenant (slug by default)")
+        parser.add_argument(
+            "--schema", help='PostgreSQL schema of the tenant (slug with "_" instead of "-" by default)'
+        )
+
+    def handle(self, *args, **options):
+        tenant = Tenant(
+            slug=options["slug"],
+            name=options["name"] or options["slug"],
+            schema=options["schema"] or options["slug"].lower().replace("-", "_"),
+        )
+        try:
+            tenant.full_clean()
+        except ValidationError as error:
+            raise CommandError(error.message_dict)
+        if tenant.schema == PUBLIC_SCHEMA:
+            raise CommandError(f'"{PUBLIC_SCHEMA}" schema is used by the default dataset')
+
+        migrate_schema(tenant.schema, verbosity=options["verbosity"], interactive=False)
+        tenant.save()
+        cache.delete(TENANTS_CACHE_KEY)
+        self.stdout.write(f'tenant "{tenant.slug}" is created in schema "{tenant.schema}"')
@@ -0,0 +1,57 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scripts.synthetic import FORMATS, generate_dataset
+
+
+class Command(BaseCommand):
+    help = "Generates seeded synthetic dataset in the format of scripts/load.py input files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output_dir", help="Directory files are written into")
+        parser.add_argument("--cart-items", type=int, default=1_000_000, help="Number of cart items to generate")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of random generator")
+        parser.add_argument("--format", choices=FORMATS, default="csv", help="Format of generated files")
+        parser.add_argument("--start-date", default="2023-01-01", help="First day of receipts (YYYY-MM-DD)")
+        parser.add_argument("--days", type=int, default=365, help="Number of days receipts are spread over")
+        parser.add_argument("--category-depth", type=int, default=5, help="Number of levels of category tree")
+        parser.add_argument("--category-fanout", type=int, default=4, help="Average number of children of category")
+        parser.add_argument("--shop-group-depth", type=int, default=4, help="Number of levels of shop group tree")
+        parser.add_argument("--shop-group-fanout", type=int, default=3, help="Average number of children of shop group")
+        parser.add_argument("--products", type=int, help="Number of products (derived from --cart-items by default)")
+        parser.add_argument("--producers", type=int, help="Number of producers")
+        parser.add_argument("--suppliers", type=int, help="Number of suppliers")
+        parser.add_argument("--shops", type=int, help="Number of shops")
+        parser.add_argument("--chunk-size", type=int, default=1_000_000, help="Cart items generated at once")
+
+    def handle(self, *args, **options):
+        if options["cart_items"] < 1 or options["days"] < 1:
+            raise CommandError("--cart-items and --days have to be positive")
+        if min(options["category_depth"], options["shop_group_depth"]) < 1:
+            raise CommandError("trees have to have at least one level")
+        if options["format"] == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise CommandError("pyarrow has to be installed to write parquet files")
+
+        manifest = generate_dataset(
+            options["output_dir"],
+            options["cart_items"],
+            seed=options["seed"],
+            file_format=options["format"],
+            start_date=options["start_date"],
+            days=options["days"],
+            category_depth=options["category_depth"],
+            category_fanout=options["category_fanout"],
+            shop_group_depth=options["shop_group_depth"],
+            shop_group_fanout=options["shop_group_fanout"],
+            chunk_size=options["chunk_size"],
+            products=options["products"],
+            producers=options["producers"],
+            suppliers=options["suppliers"],
+            shops=options["shops"],
+        )
+        for name, rows in manifest["rows"].items():
+            self.stdout.write(f"{os.path.join(options['output_dir'], name)}.{options['format']}: {rows} rows")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from datawiz_project.models import Tenant
+from datawiz_project.tenants import migrate_schema
+
+
+class Command(BaseCommand):
+    help = 'Applies migrations of TENANT_APPS to schemas of tenants ("migrate" applies them to "public" schema)'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", nargs="+", help="Slugs of tenants to migrate (all tenants by default)")
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.order_by("slug")
+        if options["tenant"]:
+            tenants = tenants.filter(slug__in=options["tenant"])
+            unknown = set(options["tenant"]) - {tenant.slug for tenant in tenants}
+            if unknown:
+                raise CommandError(f"unknown tenants: {', '.join(sorted(unknown))}")
+
+        for tenant in tenants:
+            self.stdout.write(f'tenant "{tenant.slug}" (schema "{tenant.schema}"):')
+            migrate_schema(tenant.schema, verbosity=options["verbosity"], interactive=False)
@@ -0,0 +1,107 @@
+import glob
+import json
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from datawiz_project.tenants import PUBLIC_SCHEMA
+
+# runs of placeholders (e.g. "IN (%s, %s, %s)") and literals are collapsed, so that queries which differ only
+# in values share one fingerprint
+PLACEHOLDER_LIST = re.compile(r"%s(\s*,\s*%s)+")
+NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+STRING = re.compile(r"'(?:[^']|'')*'")
+WHITESPACE = re.compile(r"\s+")
+
+SORT_KEYS = {
+    "total": lambda group: group["total_ms"],
+    "max": lambda group: group["max_ms"],
+    "mean": lambda group: group["total_ms"] / group["count"],
+    "count": lambda group: group["count"],
+}
+
+
+def fingerprint(sql):
+    sql = STRING.sub("?", sql)
+    sql = NUMBER.sub("?", sql)
+    sql = PLACEHOLDER_LIST.sub("%s, ...", sql)
+    return WHITESPACE.sub(" ", sql).strip()
+
+
+def read_entries(path):
+    """
+    Yields entries of the log and its rotated backups (path.1, path.2, ...)
+    """
+    for file_path in [path, *sorted(glob.glob(f"{glob.escape(path)}.*"))]:
+        with open(file_path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+class Command(BaseCommand):
+    help = "Summarizes the slow-query log: query fingerprints ranked by total (or max, mean) duration"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log-file", default=settings.SLOW_QUERY_LOG_FILE, help="Slow-query log file")
+        parser.add_argument("--top", type=int, default=10, help="Number of fingerprints to show")
+        parser.add_argument("--sort", choices=SORT_KEYS, default="total", help="Ranking of fingerprints")
+        parser.add_argument("--since", help="Only entries logged after this datetime (ISO format)")
+        parser.add_argument("--view", help="Only entries of this view name (e.g. product-list)")
+        parser.add_argument("--tenant", help='Only entries of this tenant (slug, "public" for requests without one)')
+        parser.add_argument("--plans", action="store_true", help="Show plan of the slowest execution")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            since = parse_datetime(options["since"])
+            if since is None:
+                raise CommandError("--since has to be ISO datetime")
+
+        groups = defaultdict(
+            lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "views": defaultdict(int), "slowest": None}
+        )
+        try:
+            entries = list(read_entries(options["log_file"]))
+        except FileNotFoundError:
+            raise CommandError(f"{options['log_file']} does not exist, is SLOW_QUERY_LOG turned on?")
+
+        for entry in entries:
+            if since and parse_datetime(entry["time"]) < since:
+                continue
+            if options["view"] and entry["view"] != options["view"]:
+                continue
+            if options["tenant"] and (entry.get("tenant") or PUBLIC_SCHEMA) != options["tenant"]:
+                continue
+            group = groups[fingerprint(entry["sql"])]
+            group["count"] += 1
+            group["total_ms"] += entry["duration_ms"]
+            group["views"][entry["view"]] += 1
+            if entry["duration_ms"] > group["max_ms"]:
+                group["max_ms"] = entry["duration_ms"]
+                group["slowest"] = entry
+
+        ranked = sorted(groups.items(), key=lambda item: SORT_KEYS[options["sort"]](item[1]), reverse=True)
+        self.stdout.write(
+            f"{sum(group['count'] for group in groups.values())} slow queries, {len(groups)} fingerprints"
+        )
+        for rank, (sql, group) in enumerate(ranked[: options["top"]], start=1):
+            slowest = group["slowest"]
+            views = ", ".join(f"{view} ({count})" for view, count in sorted(group["views"].items(), key=str))
+            self.stdout.write(
+                f"\n#{rank}: {group['count']} times, total {group['total_ms']:.0f} ms, "
+                f"mean {group['total_ms'] / group['count']:.1f} ms, max {group['max_ms']:.1f} ms"
+            )
+            self.stdout.write(f"  views: {views}")
+            self.stdout.write(
+                f"  slowest: {slowest['method']} {slowest['path']} {slowest['query_params']} "
+                f"(tenant: {slowest.get('tenant') or PUBLIC_SCHEMA})"
+            )
+            self.stdout.write(f"  sql: {sql[:1000]}")
+            if options["plans"] and slowest.get("plan"):
+                self.stdout.write("  plan:\n    " + slowest["plan"].replace("\n", "\n    "))
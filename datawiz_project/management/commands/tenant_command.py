@@ -0,0 +1,27 @@
+import argparse
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from datawiz_project.models import Tenant
+from datawiz_project.tenants import activate
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs management command with the dataset of a tenant, "
+        'e.g. "tenant_command chain refresh_daily_sales" or "tenant_command chain runscript load --script-args dir"'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("tenant", help="Slug of the tenant")
+        parser.add_argument("command_name", help="Command to run")
+        parser.add_argument("command_args", nargs=argparse.REMAINDER, help="Arguments of the command")
+
+    def handle(self, *args, **options):
+        schema = Tenant.objects.filter(slug=options["tenant"]).values_list("schema", flat=True).first()
+        if schema is None:
+            raise CommandError(f'tenant "{options["tenant"]}" does not exist')
+
+        with activate(schema):
+            call_command(options["command_name"], *options["command_args"])
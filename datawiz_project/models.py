@@ -0,0 +1,37 @@
+from django.core.validators import RegexValidator
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+# unquoted PostgreSQL identifier, "pg_" prefix is reserved for system schemas
+SCHEMA_NAME_PATTERN = r"^(?!pg_)[a-z_][a-z0-9_]{0,62}$"
+
+
+class TableVersion(models.Model):
+    """
+    Version stamp of a table, bumped on every change of its rows (see datawiz_project.versions)
+    """
+
+    table = models.CharField(max_length=255, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+
+class Tenant(models.Model):
+    """
+    Retail chain with its own dataset: tables of settings.TENANT_APPS in PostgreSQL schema "schema"
+    (see datawiz_project.tenants). Tenants are stored in "public" schema.
+    """
+
+    slug = models.SlugField(max_length=63, unique=True)
+    name = models.CharField(max_length=255)
+    schema = models.CharField(
+        max_length=63,
+        unique=True,
+        validators=[
+            RegexValidator(SCHEMA_NAME_PATTERN, _('Назва схеми має складатися з малих латинських літер, цифр та "_".'))
+        ],
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.slug
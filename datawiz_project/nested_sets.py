@@ -0,0 +1,103 @@
+"""
+Helpers for keeping nested set columns ("left", "right", "level") of tree models in sync with "parent" links.
+"""
+from collections import defaultdict
+
+import psycopg2.extras as extras
+from django.db import connection, transaction
+
+from datawiz_project.versions import bump_table_versions
+
+DEFAULT_ROOT_LEVEL = 1
+
+
+def compute_nested_sets(nodes, root_level=DEFAULT_ROOT_LEVEL):
+    """
+    Computes nested set values for forest of nodes in O(n). Numbering is global across all roots,
+    so "left"/"right" ranges of different trees never overlap.
+    :param nodes: iterable of (id, parent_id) in the order siblings have to be numbered
+    :param root_level: level assigned to roots
+    :return: (dict of id -> (left, right, level), list of ids that are not reachable from any root)
+    """
+    children = defaultdict(list)
+    roots = []
+    ids = []
+    for node_id, parent_id in nodes:
+        ids.append(node_id)
+        if parent_id is None:
+            roots.append(node_id)
+        else:
+            children[parent_id].append(node_id)
+
+    left, level = {}, {}
+    values = {}
+    counter = 1
+    stack = [(root, root_level, False) for root in reversed(roots)]
+    while stack:
+        node, node_level, closing = stack.pop()
+        if closing:
+            values[node] = (left[node], counter, level[node])
+        else:
+            left[node], level[node] = counter, node_level
+            stack.append((node, node_level, True))
+            stack.extend((child, node_level + 1, False) for child in reversed(children[node]))
+        counter += 1
+
+    # nodes which are never reached are parts of cycles (or reference missing parents)
+    unreachable = [node_id for node_id in ids if node_id not in values]
+    return values, unreachable
+
+
+def get_tree_nodes(model):
+    """
+    Returns (id, parent_id, left, right, level) of all nodes, siblings are kept in their current order
+    """
+    return list(model.objects.order_by("left", "id").values_list("id", "parent_id", "left", "right", "level"))
+
+
+def get_root_level(nodes):
+    root_levels = [level for _, parent_id, _, _, level in nodes if parent_id is None]
+    return min(root_levels) if root_levels else DEFAULT_ROOT_LEVEL
+
+
+def find_nested_set_errors(model):
+    """
+    Compares stored nested set values with values computed from "parent" links
+    :return: (list of ids whose values are inconsistent, list of unreachable ids)
+    """
+    nodes = get_tree_nodes(model)
+    values, unreachable = compute_nested_sets(((node[0], node[1]) for node in nodes), get_root_level(nodes))
+    inconsistent = [node[0] for node in nodes if node[0] in values and values[node[0]] != tuple(node[2:])]
+    return inconsistent, unreachable
+
+
+def rebuild_nested_set(model):
+    """
+    Recomputes "left", "right" and "level" of all nodes from "parent" links and stores changed rows
+    with a single UPDATE statement
+    :return: number of updated rows
+    """
+    nodes = get_tree_nodes(model)
+    values, unreachable = compute_nested_sets(((node[0], node[1]) for node in nodes), get_root_level(nodes))
+    if unreachable:
+        raise ValueError(f"{model.__name__} tree contains cycles, unreachable ids: {unreachable[:20]}")
+
+    changed = [(node[0], *values[node[0]]) for node in nodes if values[node[0]] != tuple(node[2:])]
+    if not changed:
+        return 0
+
+    table = model._meta.db_table
+    # changed rows are stamped, so that delta sync ("modified_since") delivers their new positions
+    stamp = ', "updated_at" = NOW()' if any(field.name == "updated_at" for field in model._meta.fields) else ""
+    update_query = f"""
+        UPDATE {table}
+        SET "left" = data.left_value, "right" = data.right_value, "level" = data.level_value{stamp}
+        FROM (VALUES %s) AS data (id, left_value, right_value, level_value)
+        WHERE {table}.id = data.id
+            AND ({table}."left", {table}."right", {table}."level")
+                IS DISTINCT FROM (data.left_value, data.right_value, data.level_value)
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        extras.execute_values(cursor, update_query, changed, page_size=len(changed))
+        bump_table_versions(table)
+    return len(changed)
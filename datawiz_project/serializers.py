@@ -0,0 +1,50 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import (BaseSerializer, ModelSerializer,
+                                        PrimaryKeyRelatedField)
+
+
+class DynamicFieldsModelSerializer(ModelSerializer):
+    """
+    Serializer which can be narrowed to the given fields. Nested serializers which are not listed in "expand"
+    are replaced with primary keys. Without both arguments serializer returns its full representation.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            return
+
+        if fields is not None:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise ValidationError(detail={"fields": _("Невідомі поля: ") + ", ".join(sorted(unknown))})
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+        expand = set(expand or ())
+        nested = {name for name, field in self.fields.items() if isinstance(field, BaseSerializer)}
+        if expand - nested:
+            raise ValidationError(detail={"expand": _("Невідомі зв'язки: ") + ", ".join(sorted(expand - nested))})
+        for name in nested - expand:
+            source = self.fields[name].source
+            self.fields[name] = PrimaryKeyRelatedField(read_only=True, **({"source": source} if source != name else {}))
+
+
+def serializer_query_paths(serializer, prefix=""):
+    """
+    Collects model fields serializer reads and relations it traverses
+    :return: (list of paths for QuerySet.only, list of paths for QuerySet.select_related)
+    """
+    only, related = [], []
+    for field in serializer.fields.values():
+        if field.source == "*":
+            continue
+        path = prefix + field.source.replace(".", "__")
+        only.append(path)
+        if isinstance(field, BaseSerializer):
+            related.append(path)
+            nested_only, nested_related = serializer_query_paths(field, prefix=f"{path}__")
+            only.extend(nested_only)
+            related.extend(nested_related)
+    return only, related
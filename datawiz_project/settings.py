@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     "rest_framework",
     "debug_toolbar",
     # apps
+    "datawiz_project",
     "products",
     "receipts",
     "shops",
@@ -45,7 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "datawiz_project.tenants.TenantMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
+    "datawiz_project.slow_queries.SlowQueryLogMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -90,6 +93,19 @@ DATABASES = {
     }
 }
 
+DATABASE_ROUTERS = ["datawiz_project.tenants.TenantRouter"]
+
+# Tenants (see datawiz_project.tenants): every tenant has tables of TENANT_APPS in its own schema
+TENANT_APPS = ["datawiz_project", "products", "receipts", "shops"]
+# header naming the tenant of a request ("X-Tenant: <slug>")
+TENANT_HEADER = env("TENANT_HEADER", default="X-Tenant")
+# tenant can also be named by subdomain of this domain ("<slug>.<TENANT_DOMAIN>")
+TENANT_DOMAIN = env("TENANT_DOMAIN", default=None)
+# requests without a tenant are rejected instead of using the dataset of "public" schema
+TENANT_REQUIRED = env.bool("TENANT_REQUIRED", default=False)
+# seconds the list of tenants is cached by every process
+TENANT_CACHE_TTL = env.int("TENANT_CACHE_TTL", default=60)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -122,6 +138,17 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Cache shared by processes has to be configured for production, e.g. CACHE_URL=dbcache://cache_table
+# (with "manage.py createcachetable") or CACHE_URL=rediscache://host:6379/1. Keys are prefixed with the schema
+# of the current tenant.
+CACHES = {
+    "default": {
+        **env.cache("CACHE_URL", default="locmemcache://"),
+        "KEY_FUNCTION": "datawiz_project.tenants.make_cache_key",
+    }
+}
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
@@ -131,3 +158,24 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Background analytics reports (see receipts.reports)
+# seconds a computed report is served from cache
+REPORT_RESULT_TTL = env.int("REPORT_RESULT_TTL", default=60 * 60)
+# total size of cached report results in bytes, least recently accessed results are evicted first
+REPORT_CACHE_MAX_BYTES = env.int("REPORT_CACHE_MAX_BYTES", default=256 * 1024 * 1024)
+# running jobs older than this number of seconds are considered lost (worker died) and are queued again
+REPORT_JOB_TIMEOUT = env.int("REPORT_JOB_TIMEOUT", default=30 * 60)
+
+# seconds terminal heatmaps are served from cache
+HEATMAP_CACHE_TTL = env.int("HEATMAP_CACHE_TTL", default=15 * 60)
+
+# Slow-query log of API requests (see datawiz_project.slow_queries and "slow_queries_report" command)
+SLOW_QUERY_LOG = env.bool("SLOW_QUERY_LOG", default=False)
+# queries that take at least this number of milliseconds are logged with EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_THRESHOLD_MS = env.float("SLOW_QUERY_THRESHOLD_MS", default=100)
+# share of requests whose queries are timed (explained queries are executed twice)
+SLOW_QUERY_SAMPLE_RATE = env.float("SLOW_QUERY_SAMPLE_RATE", default=0.1)
+SLOW_QUERY_LOG_FILE = env("SLOW_QUERY_LOG_FILE", default=os.path.join(BASE_DIR, "logs/slow_queries.log"))
+SLOW_QUERY_LOG_MAX_BYTES = env.int("SLOW_QUERY_LOG_MAX_BYTES", default=10 * 1024 * 1024)
+SLOW_QUERY_LOG_BACKUP_COUNT = env.int("SLOW_QUERY_LOG_BACKUP_COUNT", default=5)
@@ -0,0 +1,130 @@
+"""
+Opt-in slow-query log: queries of API requests that take longer than SLOW_QUERY_THRESHOLD_MS are written to
+the rotating SLOW_QUERY_LOG_FILE (one json object per line) together with the view, query params of the request
+and EXPLAIN (ANALYZE, BUFFERS) of the query. See "slow_queries_report" command for the summary.
+"""
+import json
+import logging
+import os
+import random
+import re
+import time
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# only queries are explained (see explain(), EXPLAIN ANALYZE executes the statement once more)
+EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+
+def configure_logger():
+    """
+    Attaches rotating file handler to the logger once (log records are json lines, no formatting is added)
+    """
+    if logger.handlers:
+        return
+    os.makedirs(os.path.dirname(settings.SLOW_QUERY_LOG_FILE), exist_ok=True)
+    handler = RotatingFileHandler(
+        settings.SLOW_QUERY_LOG_FILE,
+        maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+        backupCount=settings.SLOW_QUERY_LOG_BACKUP_COUNT,
+        encoding="utf-8",
+    )
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class SlowQueryRecorder:
+    """
+    Database execute wrapper collecting queries that took longer than the threshold
+    """
+
+    def __init__(self, threshold_ms):
+        self.threshold_ms = threshold_ms
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            if duration_ms >= self.threshold_ms:
+                self.queries.append({"sql": sql, "params": params, "many": many, "duration_ms": duration_ms})
+
+
+def explain(sql, params):
+    """
+    Plan of the query with actual timings. The query is executed once more inside a read-only transaction that
+    is rolled back, so data-modifying CTEs, row locks (FOR UPDATE) and sequence changes (nextval, setval) fail
+    instead of being repeated; such queries get the plan without execution.
+    """
+    if not EXPLAINABLE.match(sql):
+        return None
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET TRANSACTION READ ONLY")
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+            transaction.set_rollback(True)
+            return "\n".join(row[0] for row in cursor.fetchall())
+    except DatabaseError:
+        pass
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {sql}", params)
+            return "\n".join(row[0] for row in cursor.fetchall())
+    except DatabaseError as error:
+        return f"EXPLAIN failed: {error}"
+
+
+class SlowQueryLogMiddleware:
+    """
+    Records slow queries of sampled requests (SLOW_QUERY_SAMPLE_RATE is the share of requests that are recorded).
+    Is removed from the middleware chain unless SLOW_QUERY_LOG is turned on.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG:
+            raise MiddlewareNotUsed
+        configure_logger()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.SLOW_QUERY_SAMPLE_RATE:
+            return self.get_response(request)
+
+        recorder = SlowQueryRecorder(settings.SLOW_QUERY_THRESHOLD_MS)
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        # plans are captured after the response is built, so that explained queries are not recorded themselves
+        # and do not run inside transactions of the view
+        match = request.resolver_match
+        for query in recorder.queries:
+            params = None if query["many"] else query["params"]
+            logger.info(
+                json.dumps(
+                    {
+                        "time": timezone.now().isoformat(),
+                        "method": request.method,
+                        "path": request.path,
+                        "tenant": getattr(request, "tenant", None),
+                        "view": match.view_name if match else None,
+                        "view_function": match._func_path if match else None,
+                        "query_params": request.GET.dict(),
+                        "status": response.status_code,
+                        "duration_ms": round(query["duration_ms"], 3),
+                        "sql": query["sql"],
+                        "params": params,
+                        "plan": None if query["many"] else explain(query["sql"], params),
+                    },
+                    default=str,
+                )
+            )
+        return response
@@ -0,0 +1,154 @@
+"""
+Datasets of several retail chains in one deployment: every tenant (see datawiz_project.models.Tenant) has its own
+PostgreSQL schema with tables of settings.TENANT_APPS, so rows, indexes and planner statistics of one chain
+do not affect queries of another. Tenants, users and sessions, as well as the default dataset of requests
+without a tenant, stay in "public" schema.
+
+Schema of the current tenant is kept in a context variable. All tenants share database connections (and
+their pool), a connection switches its search_path when the tenant changes, so connection poolers have to
+keep sessions (e.g. pgbouncer in session mode). Cache keys are prefixed with the schema.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import JsonResponse
+from django.utils.translation import gettext_lazy as _
+
+from datawiz_project.models import Tenant
+
+PUBLIC_SCHEMA = "public"
+
+# (app_label, model_name) of TENANT_APPS models whose tables exist only in "public" schema
+SHARED_MODELS = {("datawiz_project", "tenant")}
+
+TENANTS_CACHE_KEY = "tenant-schemas"
+
+# (schema, whether "public" schema is searched after it)
+_tenant = ContextVar("tenant", default=(PUBLIC_SCHEMA, True))
+
+
+def current_schema():
+    return _tenant.get()[0]
+
+
+def search_path(schema, include_public=True):
+    return f'"{schema}", public' if include_public and schema != PUBLIC_SCHEMA else f'"{schema}"'
+
+
+def apply_search_path(conn):
+    """
+    Sets search_path of the connection to the current tenant. The connection remembers it, so that SET is skipped
+    when the path does not change: requests without a tenant and nested activations of the same schema do not
+    run it, a request of a tenant runs it twice (to its schema and back to "public" schema when it ends).
+    Connections that are not opened yet get it on connect.
+    """
+    path = search_path(*_tenant.get())
+    if conn.connection is None or getattr(conn, "tenant_search_path", None) == path:
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"SET search_path TO {path}")
+    # SET inside a transaction is undone by its rollback, so it is not remembered
+    conn.tenant_search_path = None if conn.in_atomic_block else path
+
+
+def connection_created_handler(sender, connection, **kwargs):
+    connection.tenant_search_path = None
+    apply_search_path(connection)
+
+
+@contextmanager
+def activate(schema, include_public=True):
+    """
+    Queries inside the block (also of processes forked inside it) use tables of the schema
+    """
+    token = _tenant.set((schema, include_public))
+    apply_search_path(connection)
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+        apply_search_path(connection)
+
+
+def get_tenant_schema(slug):
+    """
+    :return: schema of the tenant, or None if there is no such tenant (tenants are cached for TENANT_CACHE_TTL)
+    """
+    schemas = cache.get_or_set(
+        TENANTS_CACHE_KEY, lambda: dict(Tenant.objects.values_list("slug", "schema")), settings.TENANT_CACHE_TTL
+    )
+    return schemas.get(slug)
+
+
+def tenant_schemas():
+    """
+    :return: schemas of all datasets: "public" schema and schemas of all tenants
+    """
+    return [PUBLIC_SCHEMA, *Tenant.objects.order_by("slug").values_list("schema", flat=True)]
+
+
+def migrate_schema(schema, **options):
+    """
+    Creates schema (if it does not exist) and applies migrations of TENANT_APPS to it
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+    # "public" is not searched, so that applied migrations are recorded in django_migrations of the schema
+    with activate(schema, include_public=False):
+        call_command("migrate", **options)
+
+
+def make_cache_key(key, key_prefix, version):
+    """
+    KEY_FUNCTION of the cache: keys are prefixed with schema of the current tenant
+    """
+    return f"{key_prefix}:{version}:{current_schema()}:{key}"
+
+
+def request_tenant_slug(request):
+    """
+    Tenant is named by TENANT_HEADER or by subdomain of TENANT_DOMAIN (e.g. "chain.datawiz.example")
+    """
+    slug = request.headers.get(settings.TENANT_HEADER)
+    if slug:
+        return slug
+    if settings.TENANT_DOMAIN:
+        host = request.get_host().rsplit(":", 1)[0]
+        subdomain, _dot, domain = host.partition(".")
+        if domain == settings.TENANT_DOMAIN:
+            return subdomain
+    return None
+
+
+class TenantRouter:
+    """
+    Tenant schemas get tables of TENANT_APPS (except SHARED_MODELS), "public" schema gets all tables
+    """
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if current_schema() == PUBLIC_SCHEMA:
+            return None
+        return app_label in settings.TENANT_APPS and (app_label, model_name) not in SHARED_MODELS
+
+
+class TenantMiddleware:
+    """
+    Executes request with the dataset of its tenant (request.tenant is the slug). Requests without a tenant
+    use the dataset of "public" schema, unless TENANT_REQUIRED is turned on.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.tenant = request_tenant_slug(request)
+        schema = get_tenant_schema(request.tenant) if request.tenant else None
+        if schema is None and (request.tenant or settings.TENANT_REQUIRED):
+            return JsonResponse({"detail": _("Мережу не знайдено.")}, status=404)
+
+        with activate(schema or PUBLIC_SCHEMA):
+            return self.get_response(request)
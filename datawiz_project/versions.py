@@ -0,0 +1,41 @@
+"""
+Per-table version stamps, used to answer conditional requests without querying the tables themselves.
+"""
+from django.apps import apps
+from django.db import connection
+
+from datawiz_project.apps import VERSIONED_MODELS
+
+BUMP_QUERY = """
+    INSERT INTO datawiz_project_tableversion ("table", version, updated_at)
+    SELECT t, 1, NOW() FROM UNNEST(%s::text[]) AS t
+    ON CONFLICT ("table") DO UPDATE SET
+        version = datawiz_project_tableversion.version + 1,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+def versioned_tables():
+    return {apps.get_model(model_name)._meta.db_table for model_name in VERSIONED_MODELS}
+
+
+def bump_table_versions(*tables):
+    with connection.cursor() as cursor:
+        cursor.execute(BUMP_QUERY, [sorted(tables)])
+
+
+def bump_model_version(sender, **kwargs):
+    bump_table_versions(sender._meta.db_table)
+
+
+def get_table_versions(tables):
+    """
+    :return: dict of table -> (version, updated_at), tables that were never changed have (0, None)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT "table", version, updated_at FROM datawiz_project_tableversion WHERE "table" = ANY(%s)',
+            [sorted(tables)],
+        )
+        versions = {table: (version, updated_at) for table, version, updated_at in cursor.fetchall()}
+    return {table: versions.get(table, (0, None)) for table in tables}
@@ -1,3 +1,11 @@
+from datetime import datetime, timezone
+from hashlib import md5
+
+from django.db.models import Q
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.timezone import is_naive, make_aware
 from django.utils.translation import gettext_lazy as _
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
@@ -5,35 +13,144 @@ from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from datawiz_project.serializers import serializer_query_paths
+from datawiz_project.tenants import current_schema
+from datawiz_project.versions import get_table_versions
+
 
 class DisplayViewSet(ListAPIView, RetrieveAPIView, GenericViewSet):
     model = None
+    # relations joined for the full representation of objects
+    select_related_fields = ()
 
     def check_model_variable(self):
         if not self.model:
             raise AttributeError(f'You did not define "model" variable in {self.__class__.__name__}')
 
+    def get_query_shape(self):
+        """
+        Returns requested "fields" and "expand" (comma separated query parameters), or None if client
+        did not narrow the representation
+        """
+        params = self.request.query_params
+        if "fields" not in params and "expand" not in params:
+            return None
+
+        def split(name):
+            return [value for value in params[name].split(",") if value] if name in params else None
+
+        return {"fields": split("fields"), "expand": split("expand")}
+
+    def get_serializer(self, *args, **kwargs):
+        shape = self.get_query_shape()
+        if shape is not None:
+            kwargs.update(shape)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_related_paths(self):
+        """
+        Returns every relation path traversed by "select_related_fields" ("a__b" gives "a" and "a__b")
+        """
+        paths = set()
+        for field_path in self.select_related_fields:
+            parts = field_path.split("__")
+            paths.update("__".join(parts[: index + 1]) for index in range(len(parts)))
+        return sorted(paths)
+
+    def get_versioned_tables(self):
+        """
+        Tables whose changes can modify the response: table of the model and tables of related objects
+        """
+        tables = {self.model._meta.db_table}
+        for path in self.get_related_paths():
+            model = self.model
+            for name in path.split("__"):
+                model = model._meta.get_field(name).related_model
+            tables.add(model._meta.db_table)
+        return tables
+
+    def get_modified_since(self):
+        value = self.request.query_params.get("modified_since")
+        if not value:
+            return None
+
+        modified_since = parse_datetime(value)
+        if modified_since is None:
+            timestamp = parse_http_date_safe(value)
+            if timestamp is None:
+                raise ValidationError(detail={"modified_since": _("Невірний формат дати.")})
+            modified_since = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+        return make_aware(modified_since) if is_naive(modified_since) else modified_since
+
+    def filter_modified_since(self, queryset):
+        """
+        Delta sync: leaves only objects that were changed (or whose related objects were changed) after
+        "modified_since". Deleted objects are not reported. This is the only filter by "updated_at", FilterSets
+        of versioned models exclude it from their generated filters.
+        """
+        modified_since = self.get_modified_since()
+        if modified_since is None:
+            return queryset
+
+        condition = Q(updated_at__gt=modified_since)
+        for path in self.get_related_paths():
+            condition |= Q(**{f"{path}__updated_at__gt": modified_since})
+        return queryset.filter(condition)
+
+    def conditional_response(self, request, response_builder):
+        """
+        Answers with "304 Not Modified" if client already has current version of the response, otherwise
+        builds the response and marks it with ETag and Last-Modified derived from table version stamps
+        """
+        versions = get_table_versions(self.get_versioned_tables())
+        stamp = ";".join(f"{table}:{version}" for table, (version, updated_at) in sorted(versions.items()))
+        # version stamps of different tenants are equal, so the schema is a part of the tag
+        etag = '"{}"'.format(md5(f"{current_schema()}|{stamp}|{request.get_full_path()}".encode()).hexdigest())
+        updated = [updated_at for version, updated_at in versions.values() if updated_at is not None]
+        last_modified = int(max(updated).timestamp()) if updated else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = response_builder()
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
+
     def get_queryset(self):
         self.check_model_variable()
+        queryset = self.filter_modified_since(self.model.objects.all())
 
-        # if you have to make some select_related or prefetch_related, overwrite this method
-        return self.model.objects.all()
+        if self.get_query_shape() is None:
+            return queryset.select_related(*self.select_related_fields)
+
+        # load only columns of requested fields and join only expanded relations
+        only, related = serializer_query_paths(self.get_serializer())
+        if related:
+            # select_related() without arguments would join all non-null relations
+            queryset = queryset.select_related(*related)
+        return queryset.only(*only)
 
     def get_object(self):
-        self.check_model_variable()
         try:
-            return self.model.objects.get(pk=self.kwargs.get(self.lookup_field))
+            return self.get_queryset().get(pk=self.kwargs.get(self.lookup_field))
         except self.model.DoesNotExist:
             raise ValidationError(detail={"detail": _("Не знайдено.")}, code=status.HTTP_400_BAD_REQUEST)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        filtered_queryset = self.filter_queryset(queryset)
-        paginated_queryset = self.paginate_queryset(filtered_queryset)
-        serializer = self.get_serializer(instance=paginated_queryset, many=True)
-        return Response(data=serializer.data, status=status.HTTP_200_OK)
+        def build_response():
+            queryset = self.get_queryset()
+            filtered_queryset = self.filter_queryset(queryset)
+            paginated_queryset = self.paginate_queryset(filtered_queryset)
+            serializer = self.get_serializer(instance=paginated_queryset, many=True)
+            return Response(data=serializer.data, status=status.HTTP_200_OK)
+
+        return self.conditional_response(request, build_response)
 
     def retrieve(self, request, *args, **kwargs):
-        obj = self.get_object()
-        serializer = self.get_serializer(instance=obj)
-        return Response(data=serializer.data, status=status.HTTP_200_OK)
+        def build_response():
+            obj = self.get_object()
+            serializer = self.get_serializer(instance=obj)
+            return Response(data=serializer.data, status=status.HTTP_200_OK)
+
+        return self.conditional_response(request, build_response)
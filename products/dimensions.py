@@ -0,0 +1,85 @@
+"""
+Refreshing of the denormalized "product_dim" reporting table.
+"""
+from django.db import connection
+
+# ancestors are taken from nested sets, so categories have to be consistent with their "parent" links
+# (see "rebuild_nested_sets" command)
+REFRESH_QUERY = """
+    WITH products AS (
+        SELECT p.id, p.name, p.barcode, p.category_id, p.producer_id
+        FROM products_product p
+        {where}
+    ), category_paths AS (
+        SELECT c.id, ARRAY_AGG(a.id ORDER BY a."left") AS ancestor_ids
+        FROM products_category c
+        JOIN products_category a ON a."left" <= c."left" AND a."right" >= c."right"
+        WHERE c.id IN (SELECT category_id FROM products)
+        GROUP BY c.id
+    )
+    INSERT INTO product_dim (
+        product_id, name, barcode, category_id, category_name, root_category_id, root_category_name,
+        ancestor_ids, producer_id, producer_name, refreshed_at
+    )
+    SELECT p.id, p.name, p.barcode, c.id, c.name, root.id, root.name,
+           paths.ancestor_ids, pr.id, pr.name, NOW()
+    FROM products p
+    JOIN products_category c ON c.id = p.category_id
+    JOIN category_paths paths ON paths.id = c.id
+    JOIN products_category root ON root.id = paths.ancestor_ids[1]
+    LEFT JOIN products_producer pr ON pr.id = p.producer_id
+    ON CONFLICT (product_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        barcode = EXCLUDED.barcode,
+        category_id = EXCLUDED.category_id,
+        category_name = EXCLUDED.category_name,
+        root_category_id = EXCLUDED.root_category_id,
+        root_category_name = EXCLUDED.root_category_name,
+        ancestor_ids = EXCLUDED.ancestor_ids,
+        producer_id = EXCLUDED.producer_id,
+        producer_name = EXCLUDED.producer_name,
+        refreshed_at = EXCLUDED.refreshed_at
+"""
+
+DELETE_STALE_QUERY = """
+    DELETE FROM product_dim d
+    WHERE NOT EXISTS (SELECT 1 FROM products_product p WHERE p.id = d.product_id)
+"""
+
+
+def refresh_product_dim(product_ids=None, category_ids=None, producer_ids=None):
+    """
+    Upserts rows of "product_dim". Without arguments the whole table is refreshed, otherwise only products
+    with given ids, products inside subtrees of given categories or products of given producers.
+    :return: number of refreshed rows
+    """
+    conditions, params = [], []
+    if product_ids is not None:
+        conditions.append("p.id = ANY(%s)")
+        params.append(list(product_ids))
+    if category_ids is not None:
+        conditions.append(
+            "p.id IN (SELECT product_id FROM product_dim WHERE ancestor_ids && %s::bigint[])"
+            " OR p.category_id = ANY(%s)"
+        )
+        params.extend([list(category_ids), list(category_ids)])
+    if producer_ids is not None:
+        conditions.append("p.producer_id = ANY(%s)")
+        params.append(list(producer_ids))
+
+    is_full_refresh = not conditions
+    where = "" if is_full_refresh else "WHERE " + " OR ".join(f"({condition})" for condition in conditions)
+
+    with connection.cursor() as cursor:
+        cursor.execute(REFRESH_QUERY.format(where=where), params)
+        refreshed = cursor.rowcount
+        if is_full_refresh:
+            cursor.execute(DELETE_STALE_QUERY)
+    return refreshed
+
+
+def category_subtree_condition(alias="d"):
+    """
+    SQL condition (with one parameter - category id) that matches "product_dim" rows inside the category subtree
+    """
+    return f"{alias}.ancestor_ids @> ARRAY[%s]::bigint[]"
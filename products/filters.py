@@ -21,7 +21,7 @@ class CategoryFilter(FilterSet):
 
     class Meta:
         model = Category
-        fields = "__all__"
+        exclude = ["updated_at"]
 
 
 class ProductFilter(FilterSet):
@@ -43,7 +43,7 @@ class ProductFilter(FilterSet):
 
     class Meta:
         model = Product
-        exclude = "__all__"
+        exclude = ["updated_at"]
 
 
 class ProducerFilter(FilterSet):
@@ -58,4 +58,4 @@ class ProducerFilter(FilterSet):
 
     class Meta:
         model = Producer
-        fields = "__all__"
+        exclude = ["updated_at"]
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from datawiz_project.nested_sets import (find_nested_set_errors,
+                                         rebuild_nested_set)
+from products.dimensions import refresh_product_dim
+from products.models import Category
+from shops.models import ShopGroup
+
+TREE_MODELS = (Category, ShopGroup)
+
+
+class Command(BaseCommand):
+    help = 'Recomputes "left", "right" and "level" of categories and shop groups from their "parent" links'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only validate nested sets, exit with error if they are inconsistent with parent links",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            self.check_trees()
+            return
+
+        for model in TREE_MODELS:
+            try:
+                updated = rebuild_nested_set(model)
+            except ValueError as error:
+                raise CommandError(str(error))
+            self.stdout.write(f"{model.__name__}: {updated} rows updated")
+
+            # category ancestors of "product_dim" are taken from nested sets
+            if model is Category and updated:
+                refresh_product_dim()
+
+    def check_trees(self):
+        is_consistent = True
+        for model in TREE_MODELS:
+            inconsistent, unreachable = find_nested_set_errors(model)
+            if inconsistent or unreachable:
+                is_consistent = False
+                self.stderr.write(
+                    f"{model.__name__}: {len(inconsistent)} inconsistent rows (e.g. {inconsistent[:10]}), "
+                    f"{len(unreachable)} rows in cycles (e.g. {unreachable[:10]})"
+                )
+            else:
+                self.stdout.write(f"{model.__name__}: consistent")
+
+        if not is_consistent:
+            raise CommandError("Nested sets are inconsistent, run the command without --check to rebuild them")
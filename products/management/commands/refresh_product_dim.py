@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.dimensions import refresh_product_dim
+
+
+class Command(BaseCommand):
+    help = 'Refreshes denormalized "product_dim" reporting table'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product", type=int, nargs="+", help="Refresh only products with given ids")
+
+    def handle(self, *args, **options):
+        refreshed = refresh_product_dim(product_ids=options["product"])
+        self.stdout.write(f"product_dim: {refreshed} rows refreshed")
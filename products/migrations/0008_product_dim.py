@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:49
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_alter_product_producer"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductDim",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="dim",
+                        serialize=False,
+                        to="products.product",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("barcode", models.TextField(blank=True, null=True)),
+                ("category_id", models.BigIntegerField()),
+                ("category_name", models.CharField(max_length=255)),
+                ("root_category_id", models.BigIntegerField()),
+                ("root_category_name", models.CharField(max_length=255)),
+                (
+                    "ancestor_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.BigIntegerField(), default=list, size=None
+                    ),
+                ),
+                ("producer_id", models.BigIntegerField(blank=True, null=True)),
+                (
+                    "producer_name",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                ("refreshed_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "product_dim",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="category",
+            index=models.Index(
+                fields=["left", "right"], name="category_nested_set_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productdim",
+            index=models.Index(fields=["category_id"], name="product_dim_category_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="productdim",
+            index=models.Index(
+                fields=["root_category_id"], name="product_dim_root_category_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productdim",
+            index=models.Index(fields=["producer_id"], name="product_dim_producer_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="productdim",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["ancestor_ids"], name="product_dim_ancestors_idx"
+            ),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 
 
@@ -7,10 +9,15 @@ class Category(models.Model):
     left = models.BigIntegerField()
     right = models.BigIntegerField()
     level = models.BigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["left", "right"], name="category_nested_set_idx")]
 
 
 class Producer(models.Model):
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
 
 class Product(models.Model):
@@ -19,3 +26,32 @@ class Product(models.Model):
     producer = models.ForeignKey(Producer, on_delete=models.PROTECT, blank=True, null=True)
     article = models.TextField(blank=True, null=True)
     barcode = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+
+class ProductDim(models.Model):
+    """
+    Denormalized product dimension for reporting, kept up to date by products.dimensions.refresh_product_dim
+    """
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="dim")
+    name = models.CharField(max_length=255)
+    barcode = models.TextField(blank=True, null=True)
+    category_id = models.BigIntegerField()
+    category_name = models.CharField(max_length=255)
+    root_category_id = models.BigIntegerField()
+    root_category_name = models.CharField(max_length=255)
+    # ids of all categories from the root down to the product category (inclusive)
+    ancestor_ids = ArrayField(models.BigIntegerField(), default=list)
+    producer_id = models.BigIntegerField(blank=True, null=True)
+    producer_name = models.CharField(max_length=255, blank=True, null=True)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "product_dim"
+        indexes = [
+            models.Index(fields=["category_id"], name="product_dim_category_idx"),
+            models.Index(fields=["root_category_id"], name="product_dim_root_category_idx"),
+            models.Index(fields=["producer_id"], name="product_dim_producer_idx"),
+            GinIndex(fields=["ancestor_ids"], name="product_dim_ancestors_idx"),
+        ]
@@ -1,5 +1,7 @@
 from rest_framework.serializers import ModelSerializer
 
+from datawiz_project.serializers import DynamicFieldsModelSerializer
+
 from .models import Category, Producer, Product
 
 
@@ -9,7 +11,7 @@ class CategoryDisplaySerializer(ModelSerializer):
         fields = ["id", "name"]
 
 
-class CategorySerializer(ModelSerializer):
+class CategorySerializer(DynamicFieldsModelSerializer):
     parent = CategoryDisplaySerializer()
 
     class Meta:
@@ -17,13 +19,13 @@ class CategorySerializer(ModelSerializer):
         fields = "__all__"
 
 
-class ProducerSerializer(ModelSerializer):
+class ProducerSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Producer
         fields = "__all__"
 
 
-class ProductSerializer(ModelSerializer):
+class ProductSerializer(DynamicFieldsModelSerializer):
     category = CategoryDisplaySerializer()
     producer = ProducerSerializer()
 
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from products.dimensions import refresh_product_dim
+from products.models import Category, Producer, Product
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_dimension(sender, instance, **kwargs):
+    refresh_product_dim(product_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_dimension(sender, instance, **kwargs):
+    refresh_product_dim(category_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Producer)
+def refresh_producer_dimension(sender, instance, **kwargs):
+    refresh_product_dim(producer_ids=[instance.pk])
@@ -1,7 +1,4 @@
-from django.utils.translation import gettext_lazy as _
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import status
-from rest_framework.exceptions import ValidationError
 
 from datawiz_project.paginators import CustomNumberPaginator
 from datawiz_project.viewsets import DisplayViewSet
@@ -17,17 +14,7 @@ class CategoryViewSet(DisplayViewSet):
     pagination_class = CustomNumberPaginator
     filter_backends = (DjangoFilterBackend,)
     filterset_class = CategoryFilter
-
-    def get_queryset(self):
-        return self.model.objects.select_related("parent__parent__parent").all()
-
-    def get_object(self):
-        try:
-            return self.model.objects.select_related("parent__parent__parent").get(
-                pk=self.kwargs.get(self.lookup_field)
-            )
-        except self.model.DoesNotExist:
-            raise ValidationError(detail={"detail": _("Не знайдено.")}, code=status.HTTP_400_BAD_REQUEST)
+    select_related_fields = ("parent__parent__parent",)
 
 
 class ProductViewSet(DisplayViewSet):
@@ -36,15 +23,7 @@ class ProductViewSet(DisplayViewSet):
     pagination_class = CustomNumberPaginator
     filter_backends = (DjangoFilterBackend,)
     filterset_class = ProductFilter
-
-    def get_queryset(self):
-        return self.model.objects.select_related("category", "producer").all()
-
-    def get_object(self):
-        try:
-            return self.model.objects.select_related("category", "producer").get(pk=self.kwargs.get(self.lookup_field))
-        except self.model.DoesNotExist:
-            raise ValidationError(detail={"detail": _("Не знайдено.")}, code=status.HTTP_400_BAD_REQUEST)
+    select_related_fields = ("category", "producer")
 
 
 class ProducerViewSet(DisplayViewSet):
@@ -0,0 +1,555 @@
+"""
+SQL analytics over cart items. Every query aggregates inside the database and joins products only
+against the denormalized "product_dim" table.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.utils import timezone
+
+from receipts.models import MONEY_PLACES, QUANTITY_PLACES
+
+# metric name -> cart item column
+METRICS = {
+    "revenue": "total_price",
+    "qty": "qty",
+    "margin": "margin_price_total",
+}
+
+# cart item (and daily sales) columns are stored in integer minor units, their sums are scaled back to exact
+# numeric values
+COLUMN_DECIMAL_PLACES = {
+    "total_price": MONEY_PLACES,
+    "qty": QUANTITY_PLACES,
+    "margin_price_total": MONEY_PLACES,
+    "revenue": MONEY_PLACES,
+    "margin": MONEY_PLACES,
+}
+
+# metric name -> daily sales column
+DAILY_SALES_METRICS = {
+    "revenue": "revenue",
+    "qty": "qty",
+    "margin": "margin",
+}
+
+SHOP_GROUP_SHOPS_QUERY = """
+    SELECT s.id FROM shops_shop s
+    JOIN shops_shopgroup g ON g.id = s.group_id
+    JOIN shops_shopgroup root ON g."left" BETWEEN root."left" AND root."right"
+    WHERE root.id = %(shop_group)s
+"""
+
+
+def fetch_dicts(cursor):
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def run_query(query, params):
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        return fetch_dicts(cursor)
+
+
+def minor_unit(column):
+    return Decimal(1).scaleb(-COLUMN_DECIMAL_PLACES[column])
+
+
+def metric_sum(column, alias="ci", condition=None):
+    """
+    Exact sum of cart item column in currency (or quantity) units. Multiplication by numeric minor unit (e.g. 0.01)
+    instead of division keeps the scale of the result equal to the number of decimal places.
+    """
+    aggregate_filter = f" FILTER (WHERE {condition})" if condition else ""
+    return f"SUM({alias}.{column}){aggregate_filter} * {minor_unit(column)}"
+
+
+def metric_sums(metrics, alias="ci"):
+    return ", ".join(f"{metric_sum(column, alias)} AS {name}" for name, column in metrics.items())
+
+
+def sales_filters(filters, alias="ci", join_receipt=False):
+    """
+    Builds joins and conditions over cart items for the common sales filters
+    :param filters: validated data of receipts.serializers.SalesFilterSerializer
+    :param alias: alias of "receipts_cartitem" table in the query
+    :param join_receipt: join "receipts_receipt" as "r" even if filters do not need it
+    :return: (joins sql, where sql, dict of params)
+    """
+    joins, conditions, params = [], [], {}
+
+    if filters.get("date_from"):
+        conditions.append(f"{alias}.date >= %(date_from)s")
+        params["date_from"] = filters["date_from"]
+    if filters.get("date_to"):
+        # "date_to" is inclusive
+        conditions.append(f"{alias}.date < %(date_to)s")
+        params["date_to"] = filters["date_to"] + timedelta(days=1)
+
+    if join_receipt or filters.get("shop") or filters.get("shop_group"):
+        joins.append(f"JOIN receipts_receipt r ON r.id = {alias}.receipt_id")
+    if filters.get("shop"):
+        conditions.append("r.shop_id = %(shop)s")
+        params["shop"] = filters["shop"]
+    if filters.get("shop_group"):
+        conditions.append(f"r.shop_id IN ({SHOP_GROUP_SHOPS_QUERY})")
+        params["shop_group"] = filters["shop_group"]
+
+    if filters.get("category"):
+        joins.append(f"JOIN product_dim fd ON fd.product_id = {alias}.product_id")
+        conditions.append("fd.ancestor_ids @> ARRAY[%(category)s]::bigint[]")
+        params["category"] = filters["category"]
+
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    return "\n".join(joins), where, params
+
+
+def daily_sales_filters(filters, alias="ds"):
+    """
+    Builds joins and conditions over the "receipts_dailysales" rollup for the common sales filters,
+    the same as sales_filters() does over cart items
+    :return: (joins sql, where sql, dict of params)
+    """
+    joins, conditions, params = [], [], {}
+
+    if filters.get("date_from"):
+        conditions.append(f"{alias}.day >= %(date_from)s")
+        params["date_from"] = filters["date_from"]
+    if filters.get("date_to"):
+        conditions.append(f"{alias}.day <= %(date_to)s")
+        params["date_to"] = filters["date_to"]
+
+    if filters.get("supplier"):
+        conditions.append(f"{alias}.supplier_id = %(supplier)s")
+        params["supplier"] = filters["supplier"]
+    if filters.get("shop"):
+        conditions.append(f"{alias}.shop_id = %(shop)s")
+        params["shop"] = filters["shop"]
+    if filters.get("shop_group"):
+        conditions.append(f"{alias}.shop_id IN ({SHOP_GROUP_SHOPS_QUERY})")
+        params["shop_group"] = filters["shop_group"]
+
+    if filters.get("category"):
+        joins.append(f"JOIN product_dim fd ON fd.product_id = {alias}.product_id")
+        conditions.append("fd.ancestor_ids @> ARRAY[%(category)s]::bigint[]")
+        params["category"] = filters["category"]
+
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    return "\n".join(joins), where, params
+
+
+def daily_sales_sums(alias="ds"):
+    return metric_sums(DAILY_SALES_METRICS, alias)
+
+
+def ranked_products_query(filters):
+    """
+    Query of products ranked by the metric with their share and cumulative share of the metric total
+    and ABC class ("A" until the cumulative share before the product reaches "a_threshold" and so on)
+    """
+    joins, where, params = sales_filters(filters)
+    metric = filters["metric"]
+    params.update(a_threshold=filters["a_threshold"], b_threshold=filters["b_threshold"])
+    query = f"""
+        WITH product_sales AS (
+            SELECT ci.product_id, {metric_sums(METRICS)}
+            FROM receipts_cartitem ci
+            {joins}
+            {where}
+            GROUP BY ci.product_id
+        ), ranked AS (
+            SELECT product_sales.*,
+                   ROW_NUMBER() OVER (ORDER BY {metric} DESC, product_id) AS rank,
+                   {metric} / NULLIF(SUM({metric}) OVER (), 0) AS share,
+                   SUM({metric}) OVER (ORDER BY {metric} DESC, product_id)
+                       / NULLIF(SUM({metric}) OVER (), 0) AS cumulative_share
+            FROM product_sales
+        )
+        SELECT ranked.*,
+               CASE
+                   WHEN cumulative_share - share < %(a_threshold)s THEN 'A'
+                   WHEN cumulative_share - share < %(b_threshold)s THEN 'B'
+                   ELSE 'C'
+               END AS abc_class
+        FROM ranked
+    """
+    return query, params
+
+
+def top_products(filters):
+    """
+    Top N products by the metric
+    :param filters: validated data of receipts.serializers.TopProductsSerializer
+    """
+    ranked_query, params = ranked_products_query(filters)
+    params["limit"] = filters["limit"]
+    query = f"""
+        WITH classified AS ({ranked_query})
+        SELECT c.rank, c.product_id, d.name, d.barcode, d.category_id, d.category_name,
+               d.producer_id, d.producer_name, c.revenue, c.qty, c.margin, c.share, c.cumulative_share, c.abc_class
+        FROM classified c
+        JOIN product_dim d ON d.product_id = c.product_id
+        WHERE c.rank <= %(limit)s
+        ORDER BY c.rank
+    """
+    return run_query(query, params)
+
+
+def abc_analysis(filters):
+    """
+    ABC classes summary and top N products of the requested class (if any)
+    :param filters: validated data of receipts.serializers.ABCAnalysisSerializer
+    """
+    ranked_query, params = ranked_products_query(filters)
+    metric = filters["metric"]
+    buckets = run_query(
+        f"""
+        WITH classified AS ({ranked_query})
+        SELECT abc_class,
+               COUNT(*) AS products,
+               SUM({metric}) AS {metric},
+               SUM(share) AS share,
+               MAX(cumulative_share) AS cumulative_share
+        FROM classified
+        GROUP BY abc_class
+        ORDER BY abc_class
+        """,
+        params,
+    )
+
+    products = []
+    if filters.get("abc_class"):
+        params.update(abc_class=filters["abc_class"], limit=filters["limit"])
+        products = run_query(
+            f"""
+            WITH classified AS ({ranked_query})
+            SELECT c.rank, c.product_id, d.name, d.category_name, d.producer_name,
+                   c.revenue, c.qty, c.margin, c.share, c.cumulative_share
+            FROM classified c
+            JOIN product_dim d ON d.product_id = c.product_id
+            WHERE c.abc_class = %(abc_class)s
+            ORDER BY c.rank
+            LIMIT %(limit)s
+            """,
+            params,
+        )
+    return {"buckets": buckets, "products": products}
+
+
+# grouping of period comparison -> (joins, ((expression, column name), ...))
+COMPARISON_GROUPS = {
+    "total": ("", ()),
+    "shop": ("JOIN shops_shop s ON s.id = r.shop_id", (("r.shop_id", "shop_id"), ("s.name", "shop_name"))),
+    "category": (
+        "JOIN product_dim d ON d.product_id = ci.product_id",
+        (("d.category_id", "category_id"), ("d.category_name", "category_name")),
+    ),
+    "root_category": (
+        "JOIN product_dim d ON d.product_id = ci.product_id",
+        (("d.root_category_id", "root_category_id"), ("d.root_category_name", "root_category_name")),
+    ),
+}
+
+
+def period_comparison(filters):
+    """
+    Metrics of the current and the previous period with their deltas, computed with one grouped scan
+    over cart items of both periods
+    :param filters: validated data of receipts.serializers.PeriodComparisonSerializer
+    """
+    joins, where, params = sales_filters(filters, join_receipt=filters["group_by"] == "shop")
+    group_joins, keys = COMPARISON_GROUPS[filters["group_by"]]
+
+    periods = {}
+    for period in ("current", "previous"):
+        params[f"{period}_from"] = filters[f"{period}_from"]
+        params[f"{period}_to"] = filters[f"{period}_to"] + timedelta(days=1)
+        periods[period] = f"ci.date >= %({period}_from)s AND ci.date < %({period}_to)s"
+
+    columns = [f"{expression} AS {name}" for expression, name in keys]
+    columns += [
+        f"COALESCE({metric_sum(column, condition=condition)}, 0) AS {period}_{name}"
+        for name, column in METRICS.items()
+        for period, condition in periods.items()
+    ]
+    deltas = [
+        f"current_{name} - previous_{name} AS {name}_delta, "
+        f"(current_{name} - previous_{name}) / NULLIF(previous_{name}, 0) AS {name}_delta_share"
+        for name in METRICS
+    ]
+    periods_condition = f"(({periods['current']}) OR ({periods['previous']}))"
+    where = f"{where} AND {periods_condition}" if where else f"WHERE {periods_condition}"
+    group_by = ("GROUP BY " + ", ".join(expression for expression, _ in keys)) if keys else ""
+    order_by = ("ORDER BY " + ", ".join(name for _, name in keys)) if keys else ""
+
+    query = f"""
+        WITH periods AS (
+            SELECT {", ".join(columns)}
+            FROM receipts_cartitem ci
+            {joins}
+            {group_joins}
+            {where}
+            {group_by}
+        )
+        SELECT periods.*, {", ".join(deltas)}
+        FROM periods
+        {order_by}
+    """
+    return run_query(query, params)
+
+
+# tree of hierarchy roll-up -> (nested set table, join of daily sales with the node they belong to, node id)
+ROLLUP_TREES = {
+    "shop_group": ("shops_shopgroup", "JOIN shops_shop s ON s.id = ds.shop_id", "s.group_id"),
+    "category": ("products_category", "JOIN product_dim d ON d.product_id = ds.product_id", "d.category_id"),
+}
+
+
+def hierarchy_rollup(filters):
+    """
+    Metrics of every node of shop group (or category) subtree including sales of all its descendants, computed
+    with one grouped query over the daily sales rollup. The subtree root is the "shop_group" (or "category")
+    filter, whole forest is returned without it.
+
+    Sales are grouped by the node they belong to, then every node is turned into two events ordered by nested set
+    values: opening at "left" carrying sales of the node itself and closing at "right". Descendants are exactly
+    the nodes opened between them, so the running total at "right" minus the running total before "left" is
+    the total of the subtree. One sort of 2 * nodes events replaces nodes * descendants range join.
+    :param filters: validated data of receipts.serializers.HierarchyRollupSerializer
+    """
+    table, member_join, member = ROLLUP_TREES[filters["tree"]]
+    joins, where, params = daily_sales_filters(filters)
+
+    root = filters.get(filters["tree"])
+    root_join = f'JOIN {table} root ON t."left" BETWEEN root."left" AND root."right"' if root else ""
+    root_condition = "WHERE root.id = %(root)s" if root else ""
+    params["root"] = root
+    level_condition = ""
+    if filters.get("max_level"):
+        level_condition = "HAVING n.level <= %(max_level)s"
+        params["max_level"] = filters["max_level"]
+
+    metrics = DAILY_SALES_METRICS
+    # sums are kept in minor units until the end, so that subtraction of running totals is exact
+    node_sums = ", ".join(f"SUM(ds.{column}) AS {name}" for name, column in metrics.items())
+    own_values = ", ".join(f"COALESCE(ns.{name}, 0) AS own_{name}" for name in metrics)
+    running_values = ", ".join(f"SUM(own_{name}) OVER positions AS running_{name}" for name in metrics)
+    totals = ", ".join(
+        f"SUM(CASE WHEN r.closing THEN r.running_{name} ELSE r.own_{name} - r.running_{name} END)"
+        f" * {minor_unit(column)} AS {name}"
+        for name, column in metrics.items()
+    )
+    query = f"""
+        WITH nodes AS (
+            SELECT t.id, t.name, t.parent_id, t.level, t."left", t."right"
+            FROM {table} t
+            {root_join}
+            {root_condition}
+        ), node_sales AS (
+            SELECT {member} AS node_id, {node_sums}
+            FROM receipts_dailysales ds
+            {member_join}
+            {joins}
+            {where}
+            GROUP BY {member}
+        ), events AS (
+            SELECT n.id, n."left" AS position, FALSE AS closing, {own_values}
+            FROM nodes n
+            LEFT JOIN node_sales ns ON ns.node_id = n.id
+            UNION ALL
+            SELECT n.id, n."right", TRUE, {", ".join("0" for _ in metrics)}
+            FROM nodes n
+        ), running AS (
+            SELECT events.*, {running_values}
+            FROM events
+            WINDOW positions AS (ORDER BY position)
+        )
+        SELECT n.id, n.name, n.parent_id, n.level, {totals}
+        FROM running r
+        JOIN nodes n ON n.id = r.id
+        GROUP BY n.id, n.name, n.parent_id, n.level, n."left"
+        {level_condition}
+        ORDER BY n."left"
+    """
+    return run_query(query, params)
+
+
+SUPPLIER_STATISTICS = """
+    COUNT(DISTINCT ds.product_id) AS products,
+    COUNT(DISTINCT ds.shop_id) AS shops,
+    COALESCE(SUM(ds.lines), 0)::bigint AS lines
+"""
+
+
+def supplier_performance(supplier, filters):
+    """
+    Totals and daily trend of supplier sales over the period, computed over the daily sales rollup
+    (index on supplier and day makes the cost proportional to the number of rollup rows of the supplier)
+    :param supplier: supplier instance
+    :param filters: validated data of receipts.serializers.SalesPeriodSerializer
+    """
+    joins, where, params = daily_sales_filters({**filters, "supplier": supplier.pk})
+    totals = run_query(
+        f"""
+        SELECT {daily_sales_sums()}, {SUPPLIER_STATISTICS}
+        FROM receipts_dailysales ds
+        {joins}
+        {where}
+        """,
+        params,
+    )[0]
+    # days without sales are reported with zero metrics, so the trend has one point per day of the period
+    trend = run_query(
+        f"""
+        WITH daily AS (
+            SELECT ds.day, {daily_sales_sums()}
+            FROM receipts_dailysales ds
+            {joins}
+            {where}
+            GROUP BY ds.day
+        )
+        SELECT days.day::date AS day,
+               {", ".join(f"COALESCE(daily.{name}, 0) AS {name}" for name in DAILY_SALES_METRICS)}
+        FROM generate_series(%(date_from)s::date, %(date_to)s::date, INTERVAL '1 day') AS days (day)
+        LEFT JOIN daily ON daily.day = days.day
+        ORDER BY days.day
+        """,
+        params,
+    )
+    for metric in DAILY_SALES_METRICS:
+        totals[metric] = totals[metric] or 0
+    return {
+        "supplier": {"id": supplier.pk, "name": supplier.name},
+        "date_from": filters["date_from"],
+        "date_to": filters["date_to"],
+        **totals,
+        "margin_rate": totals["margin"] / totals["revenue"] if totals["revenue"] else None,
+        "trend": trend,
+    }
+
+
+def supplier_ranking(filters):
+    """
+    Suppliers ranked by the metric over the period with their share of the metric total
+    :param filters: validated data of receipts.serializers.SupplierRankingSerializer
+    """
+    joins, where, params = daily_sales_filters(filters)
+    metric = filters["metric"]
+    params["limit"] = filters["limit"]
+    query = f"""
+        WITH supplier_sales AS (
+            SELECT ds.supplier_id, {daily_sales_sums()}, {SUPPLIER_STATISTICS}
+            FROM receipts_dailysales ds
+            {joins}
+            {where}
+            GROUP BY ds.supplier_id
+        ), ranked AS (
+            SELECT supplier_sales.*,
+                   ROW_NUMBER() OVER (ORDER BY {metric} DESC, supplier_id) AS rank,
+                   {metric} / NULLIF(SUM({metric}) OVER (), 0) AS share
+            FROM supplier_sales
+        )
+        SELECT r.rank, r.supplier_id, s.name, r.revenue, r.qty, r.margin,
+               r.margin / NULLIF(r.revenue, 0) AS margin_rate, r.products, r.shops, r.lines, r.share
+        FROM ranked r
+        JOIN receipts_supplier s ON s.id = r.supplier_id
+        WHERE r.rank <= %(limit)s
+        ORDER BY r.rank
+    """
+    return run_query(query, params)
+
+
+# grouping of terminal heatmaps -> (key expression, (column, expression) of names)
+HEATMAP_GROUPS = {
+    "terminal": ("b.terminal_id", (("terminal_name", "t.name"), ("shop_id", "t.shop_id"), ("shop_name", "s.name"))),
+    "shop": ("b.shop_id", (("shop_name", "s.name"),)),
+}
+
+WEEKDAYS = range(1, 8)
+
+HEATMAP_METRICS = ("receipts_per_hour", "items_per_receipt", "average_basket")
+
+HOURS = range(24)
+
+
+def weekday_counts(date_from, date_to):
+    """
+    :return: Counter of ISO weekday (1 is Monday) -> number of such days in the period (inclusive)
+    """
+    return Counter((date_from + timedelta(days=day)).isoweekday() for day in range((date_to - date_from).days + 1))
+
+
+def terminal_heatmaps(filters):
+    """
+    Hour of day x weekday heatmaps of terminal (or shop) activity: average number of receipts in the hour,
+    items per receipt and average basket value. Hours are taken in the current time zone.
+
+    Scope filters are turned into the list of terminals, so receipts are read with (terminal, date) index.
+    :param filters: validated data of receipts.serializers.TerminalHeatmapSerializer
+    :return: list of dicts with group key, names, total receipts and 7 x 24 matrices (rows are weekdays
+        from Monday, empty cells are None)
+    """
+    current_timezone = timezone.get_current_timezone()
+    params = {
+        "time_zone": str(current_timezone),
+        "date_from": datetime.combine(filters["date_from"], time.min, tzinfo=current_timezone),
+        "date_to": datetime.combine(filters["date_to"] + timedelta(days=1), time.min, tzinfo=current_timezone),
+    }
+    conditions = []
+    if filters.get("terminal"):
+        conditions.append("t.id = %(terminal)s")
+        params["terminal"] = filters["terminal"]
+    if filters.get("shop"):
+        conditions.append("t.shop_id = %(shop)s")
+        params["shop"] = filters["shop"]
+    if filters.get("shop_group"):
+        conditions.append(f"t.shop_id IN ({SHOP_GROUP_SHOPS_QUERY})")
+        params["shop_group"] = filters["shop_group"]
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    key, names = HEATMAP_GROUPS[filters["group_by"]]
+    group_columns = ", ".join(f"{expression} AS {column}" for column, expression in names)
+    group_expressions = ", ".join(expression for _, expression in names)
+    rows = run_query(
+        f"""
+        WITH baskets AS (
+            SELECT r.terminal_id, r.shop_id, r.date AT TIME ZONE %(time_zone)s AS local_date,
+                   COUNT(ci.id) AS items, COALESCE(SUM(ci.total_price), 0) AS value
+            FROM receipts_receipt r
+            LEFT JOIN receipts_cartitem ci ON ci.receipt_id = r.id
+            WHERE r.terminal_id IN (SELECT t.id FROM receipts_terminal t {where})
+                AND r.date >= %(date_from)s AND r.date < %(date_to)s
+            GROUP BY r.id
+        )
+        SELECT {key} AS id, {group_columns},
+               EXTRACT(ISODOW FROM b.local_date)::int AS weekday, EXTRACT(HOUR FROM b.local_date)::int AS hour,
+               COUNT(*) AS receipts, SUM(b.items) AS items, SUM(b.value) * {minor_unit("total_price")} AS value
+        FROM baskets b
+        JOIN receipts_terminal t ON t.id = b.terminal_id
+        JOIN shops_shop s ON s.id = b.shop_id
+        GROUP BY {key}, {group_expressions}, weekday, hour
+        ORDER BY {key}, weekday, hour
+        """,
+        params,
+    )
+
+    weekdays = weekday_counts(filters["date_from"], filters["date_to"])
+    heatmaps = {}
+    for row in rows:
+        heatmap = heatmaps.get(row["id"])
+        if heatmap is None:
+            heatmap = heatmaps[row["id"]] = {
+                filters["group_by"] + "_id": row["id"],
+                **{column: row[column] for column, _ in names},
+                "receipts": 0,
+                **{metric: [[None] * len(HOURS) for _ in WEEKDAYS] for metric in HEATMAP_METRICS},
+            }
+        weekday, hour = row["weekday"], row["hour"]
+        heatmap["receipts"] += row["receipts"]
+        heatmap["receipts_per_hour"][weekday - 1][hour] = round(row["receipts"] / weekdays[weekday], 2)
+        heatmap["items_per_receipt"][weekday - 1][hour] = round(row["items"] / row["receipts"], 2)
+        heatmap["average_basket"][weekday - 1][hour] = round(row["value"] / row["receipts"], 2)
+    return list(heatmaps.values())
@@ -0,0 +1,187 @@
+"""
+Price anomaly detection: discount depth and margin rate of every cart item are compared with robust statistics
+(median and MAD) of the same product in the same shop over the trailing window of days.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta, timezone
+from multiprocessing import get_context
+
+import numpy as np
+from django.db import connection, connections, transaction
+
+from datawiz_project.versions import bump_table_versions
+from receipts.models import PriceAnomaly
+
+# scale factor which makes MAD a consistent estimator of standard deviation of normal distribution
+MAD_SCALE = 1.4826
+
+# lower bound of scaled MAD, so that products which are almost never discounted (MAD = 0)
+# are flagged only for deviations of more than "threshold" percentage points
+MIN_SCALE = 0.01
+
+SECONDS_IN_DAY = 86400
+
+ANOMALY_ITEMS_QUERY = """
+    SELECT ci.id, ci.product_id, r.shop_id, EXTRACT(EPOCH FROM ci.date)::bigint,
+           ci.price, ci.original_price, ci.total_price, ci.margin_price_total
+    FROM receipts_cartitem ci
+    JOIN receipts_receipt r ON r.id = ci.receipt_id
+    WHERE r.shop_id = ANY(%(shops)s) AND ci.date >= %(date_from)s AND ci.date < %(date_to)s
+"""
+
+FLAGGED_COLUMNS = ("cart_item", "product", "shop", "timestamp", "metric", "value", "median", "mad", "size", "score")
+
+
+def compute_metrics(price, original_price, total_price, margin_price_total):
+    """
+    :return: dict of metric -> numpy array (NaN where metric is not defined)
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        discount_depth = np.where(original_price > 0, (original_price - price) / original_price, np.nan)
+        margin_rate = np.where(total_price > 0, margin_price_total / total_price, np.nan)
+    return {PriceAnomaly.DISCOUNT_DEPTH: discount_depth, PriceAnomaly.MARGIN_RATE: margin_rate}
+
+
+def group_medians(keys, values):
+    """
+    Vectorized median of values of every group
+    :return: (sorted unique keys, medians, group sizes)
+    """
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    unique_keys, starts, sizes = np.unique(keys, return_index=True, return_counts=True)
+    medians = (values[starts + (sizes - 1) // 2] + values[starts + sizes // 2]) / 2
+    return unique_keys, medians, sizes
+
+
+def robust_statistics(keys, values):
+    """
+    :return: (sorted unique keys, medians, median absolute deviations, group sizes)
+    """
+    unique_keys, medians, sizes = group_medians(keys, values)
+    deviations = np.abs(values - medians[np.searchsorted(unique_keys, keys)])
+    _, mads, _ = group_medians(keys, deviations)
+    return unique_keys, medians, mads, sizes
+
+
+def fetch_items(shops, date_from, date_to, chunk_size):
+    """
+    Streams cart items of shops with server-side cursor into numpy arrays
+    """
+    chunks = []
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(ANOMALY_ITEMS_QUERY, {"shops": shops, "date_from": date_from, "date_to": date_to})
+        while rows := cursor.fetchmany(chunk_size):
+            chunks.append(np.array(rows, dtype=np.float64))
+    items = np.concatenate(chunks) if chunks else np.empty((0, 8))
+    ids, products, item_shops, timestamps = (items[:, column].astype(np.int64) for column in range(4))
+    return ids, products, item_shops, timestamps, compute_metrics(*(items[:, column] for column in range(4, 8)))
+
+
+def detect_partition_anomalies(shops, date_from, date_to, window_days, threshold, min_baseline, chunk_size):
+    """
+    Flags outliers among cart items of shops between date_from and date_to (exclusive), every day is compared
+    with the window_days preceding it. Is executed inside worker processes.
+    :return: dict of FLAGGED_COLUMNS -> numpy array
+    """
+    window_start = date_from - timedelta(days=window_days)
+    ids, products, item_shops, timestamps, metrics = fetch_items(shops, window_start, date_to, chunk_size)
+    connection.close()
+
+    # one group per product in shop
+    keys = products * (max(shops) + 1) + item_shops
+    days = (timestamps - int(window_start.timestamp())) // SECONDS_IN_DAY
+
+    flagged = {column: [] for column in FLAGGED_COLUMNS}
+    for day in range(window_days, window_days + (date_to - date_from).days):
+        baseline, target = (days >= day - window_days) & (days < day), np.flatnonzero(days == day)
+        for metric, values in metrics.items():
+            defined = baseline & ~np.isnan(values)
+            unique_keys, medians, mads, sizes = robust_statistics(keys[defined], values[defined])
+            if not len(unique_keys):
+                continue
+
+            positions = np.minimum(np.searchsorted(unique_keys, keys[target]), len(unique_keys) - 1)
+            has_baseline = (unique_keys[positions] == keys[target]) & (sizes[positions] >= min_baseline)
+            scores = np.abs(values[target] - medians[positions]) / np.maximum(MAD_SCALE * mads[positions], MIN_SCALE)
+            is_outlier = has_baseline & (scores > threshold)
+
+            rows, positions = target[is_outlier], positions[is_outlier]
+            flagged["cart_item"].append(ids[rows])
+            flagged["product"].append(products[rows])
+            flagged["shop"].append(item_shops[rows])
+            flagged["timestamp"].append(timestamps[rows])
+            flagged["metric"].append(np.full(len(rows), metric, dtype=object))
+            flagged["value"].append(values[rows])
+            flagged["median"].append(medians[positions])
+            flagged["mad"].append(mads[positions])
+            flagged["size"].append(sizes[positions])
+            flagged["score"].append(scores[is_outlier])
+    return {column: np.concatenate(arrays) if arrays else np.empty(0) for column, arrays in flagged.items()}
+
+
+def shop_partitions(shops, partitions):
+    """
+    Splits shops into partitions, so that every product/shop group is processed by exactly one worker task
+    """
+    return [partition.tolist() for partition in np.array_split(np.sort(shops), partitions) if len(partition)]
+
+
+def detect_anomalies(
+    shops, date_from, date_to, window_days=28, threshold=3.5, min_baseline=10, workers=None, chunk_size=100000
+):
+    """
+    Detects price anomalies of cart items of shops and replaces previously stored anomalies of the same shops
+    and period
+    :param shops: list of shop ids
+    :param date_from: first day of the period
+    :param date_to: last day of the period (inclusive)
+    :param window_days: number of days before every day used as its baseline
+    :param threshold: minimal distance from baseline median in scaled MADs that is flagged
+    :param min_baseline: minimal number of baseline cart items of product in shop to judge its cart items
+    :param workers: number of worker processes
+    :param chunk_size: number of cart items fetched from database at once
+    :return: number of stored anomalies
+    """
+    workers = workers or os.cpu_count()
+    start = datetime.combine(date_from, time.min, tzinfo=timezone.utc)
+    end = datetime.combine(date_to + timedelta(days=1), time.min, tzinfo=timezone.utc)
+
+    results = []
+    if shops:
+        # forked workers must not share connection of the parent process
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("fork")) as executor:
+            tasks = [
+                executor.submit(
+                    detect_partition_anomalies, partition, start, end, window_days, threshold, min_baseline, chunk_size
+                )
+                for partition in shop_partitions(shops, 4 * workers)
+            ]
+            results = [task.result() for task in tasks]
+
+    anomalies = [
+        PriceAnomaly(
+            cart_item_id=cart_item,
+            product_id=product,
+            shop_id=shop,
+            date=datetime.fromtimestamp(timestamp, tz=timezone.utc),
+            metric=metric,
+            value=value,
+            baseline_median=median,
+            baseline_mad=mad,
+            baseline_size=size,
+            score=score,
+        )
+        for result in results
+        for cart_item, product, shop, timestamp, metric, value, median, mad, size, score in zip(
+            *(result[column].tolist() for column in FLAGGED_COLUMNS)
+        )
+    ]
+
+    with transaction.atomic():
+        PriceAnomaly.objects.filter(shop_id__in=shops, date__gte=start, date__lt=end).delete()
+        PriceAnomaly.objects.bulk_create(anomalies, batch_size=5000)
+    bump_table_versions(PriceAnomaly._meta.db_table)
+    return len(anomalies)
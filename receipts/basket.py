@@ -0,0 +1,210 @@
+"""
+Market-basket analysis: co-occurrence counts, support, confidence and lift of product pairs over receipts.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from multiprocessing import get_context
+
+import numpy as np
+from django.db import connection, connections, transaction
+
+from receipts.models import ProductAssociation
+from shops.models import Shop
+
+RECEIPTS_COUNT_QUERY = """
+    SELECT COUNT(*) FROM receipts_receipt r
+    WHERE r.shop_id = ANY(%(shops)s) AND r.date >= %(date_from)s AND r.date < %(date_to)s
+"""
+
+PRODUCT_RECEIPTS_QUERY = """
+    SELECT ci.product_id, COUNT(DISTINCT ci.receipt_id)
+    FROM receipts_cartitem ci
+    JOIN receipts_receipt r ON r.id = ci.receipt_id
+    WHERE r.shop_id = ANY(%(shops)s) AND r.date >= %(date_from)s AND r.date < %(date_to)s
+    GROUP BY ci.product_id
+"""
+
+BASKET_ITEMS_QUERY = """
+    SELECT ci.receipt_id, ci.product_id
+    FROM receipts_cartitem ci
+    JOIN receipts_receipt r ON r.id = ci.receipt_id
+    WHERE r.shop_id = ANY(%(shops)s) AND r.date >= %(date_from)s AND r.date < %(date_to)s
+      AND ci.product_id = ANY(%(products)s)
+    ORDER BY ci.receipt_id
+"""
+
+
+def subtree_shop_ids(shop_group):
+    return list(
+        Shop.objects.filter(group__left__gte=shop_group.left, group__right__lte=shop_group.right).values_list(
+            "id", flat=True
+        )
+    )
+
+
+def merge_counts(keys, counts):
+    """
+    Sums counts of equal keys
+    :param keys: list of numpy arrays of pair keys
+    :param counts: list of numpy arrays of counts
+    """
+    if not keys:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    unique_keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    return unique_keys, np.bincount(inverse, weights=np.concatenate(counts)).astype(np.int64)
+
+
+def count_pairs(receipts, items, products_count):
+    """
+    Counts product pairs inside baskets
+    :param receipts: numpy array of receipt ids sorted ascending
+    :param items: numpy array of dense product indexes of the same length
+    :param products_count: number of dense product indexes
+    :return: (unique pair keys "first * products_count + second" with first < second, their counts)
+    """
+    # one product counts once per basket, sorting by (receipt, item) makes items ascending inside baskets
+    baskets = np.unique(receipts * products_count + items)
+    receipts, items = baskets // products_count, baskets % products_count
+
+    starts = np.flatnonzero(np.r_[True, receipts[1:] != receipts[:-1]])
+    ends = np.r_[starts[1:], len(receipts)]
+    basket_ends = np.repeat(ends, ends - starts)
+
+    # every item is paired with all items after it in the same basket
+    positions = np.arange(len(items))
+    pairs_per_item = basket_ends - positions - 1
+    first = np.repeat(positions, pairs_per_item)
+    offsets = np.arange(len(first)) - np.repeat(np.cumsum(pairs_per_item) - pairs_per_item, pairs_per_item)
+    second = first + 1 + offsets
+
+    return np.unique(items[first] * products_count + items[second], return_counts=True)
+
+
+def count_partition_pairs(shops, products, date_from, date_to, chunk_size):
+    """
+    Streams basket items of one date partition with server-side cursor and counts product pairs.
+    Is executed inside worker processes.
+    """
+    products = np.asarray(products, dtype=np.int64)
+    keys, counts = [], []
+    carry = np.empty((0, 2), dtype=np.int64)
+
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(
+            BASKET_ITEMS_QUERY,
+            {"shops": shops, "products": products.tolist(), "date_from": date_from, "date_to": date_to},
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            chunk = np.concatenate([carry, np.array(rows, dtype=np.int64).reshape(-1, 2)])
+            if rows:
+                # the last receipt may continue in the next chunk
+                last_receipt_start = np.searchsorted(chunk[:, 0], chunk[-1, 0])
+                chunk, carry = chunk[:last_receipt_start], chunk[last_receipt_start:]
+            if len(chunk):
+                chunk_keys, chunk_counts = count_pairs(
+                    chunk[:, 0], np.searchsorted(products, chunk[:, 1]), len(products)
+                )
+                keys.append(chunk_keys)
+                counts.append(chunk_counts)
+            if not rows:
+                break
+            # keep memory bounded by the number of distinct pairs
+            if len(keys) > 16:
+                merged_keys, merged_counts = merge_counts(keys, counts)
+                keys, counts = [merged_keys], [merged_counts]
+
+    connection.close()
+    return merge_counts(keys, counts)
+
+
+def date_partitions(date_from, date_to, partition_days):
+    start = date_from
+    while start <= date_to:
+        end = min(start + timedelta(days=partition_days - 1), date_to)
+        yield start, end + timedelta(days=1)
+        start = end + timedelta(days=1)
+
+
+def compute_associations(
+    shop_group, date_from, date_to, min_support, partition_days=1, workers=None, chunk_size=100000
+):
+    """
+    Computes associations of product pairs in receipts of shops inside the shop group subtree and replaces
+    previously stored results of the same shop group and period
+    :param shop_group: ShopGroup instance
+    :param date_from: first day of the period
+    :param date_to: last day of the period (inclusive)
+    :param min_support: minimal share of receipts containing the pair
+    :param partition_days: size of date partitions processed by one worker task
+    :param workers: number of worker processes
+    :param chunk_size: number of basket items fetched from database at once
+    :return: number of stored associations
+    """
+    shops = subtree_shop_ids(shop_group)
+    period = {"shops": shops, "date_from": date_from, "date_to": date_to + timedelta(days=1)}
+
+    with connection.cursor() as cursor:
+        cursor.execute(RECEIPTS_COUNT_QUERY, period)
+        receipts_count = cursor.fetchone()[0]
+        cursor.execute(PRODUCT_RECEIPTS_QUERY, period)
+        product_receipts = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+
+    # support of a pair can not exceed support of any of its products, so only frequent products are counted
+    frequent = product_receipts[product_receipts[:, 1] >= min_support * receipts_count]
+    frequent = frequent[np.argsort(frequent[:, 0])]
+    products, product_counts = frequent[:, 0], frequent[:, 1]
+
+    keys, counts = [], []
+    if len(products) > 1:
+        # forked workers must not share connection of the parent process
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("fork")) as executor:
+            tasks = [
+                executor.submit(count_partition_pairs, shops, products, start, end, chunk_size)
+                for start, end in date_partitions(date_from, date_to, partition_days)
+            ]
+            for task in tasks:
+                partition_keys, partition_counts = task.result()
+                keys.append(partition_keys)
+                counts.append(partition_counts)
+
+    pair_keys, pair_counts = merge_counts(keys, counts)
+    is_frequent = pair_counts >= min_support * receipts_count
+    pair_keys, pair_counts = pair_keys[is_frequent], pair_counts[is_frequent]
+    first, second = pair_keys // max(len(products), 1), pair_keys % max(len(products), 1)
+
+    support = pair_counts / receipts_count if receipts_count else pair_counts * 0.0
+    item_support = product_counts / receipts_count if receipts_count else product_counts * 0.0
+
+    associations = []
+    # every pair is stored in both directions, so "bought with X" is a single index lookup
+    for antecedent, consequent in ((first, second), (second, first)):
+        confidence = pair_counts / product_counts[antecedent]
+        lift = confidence / item_support[consequent]
+        associations.extend(
+            ProductAssociation(
+                shop_group=shop_group,
+                period_start=date_from,
+                period_end=date_to,
+                product_id=product_id,
+                associated_product_id=associated_product_id,
+                receipts=pair_receipts,
+                support=pair_support,
+                confidence=pair_confidence,
+                lift=pair_lift,
+            )
+            for product_id, associated_product_id, pair_receipts, pair_support, pair_confidence, pair_lift in zip(
+                products[antecedent].tolist(),
+                products[consequent].tolist(),
+                pair_counts.tolist(),
+                support.tolist(),
+                confidence.tolist(),
+                lift.tolist(),
+            )
+        )
+
+    with transaction.atomic():
+        ProductAssociation.objects.filter(shop_group=shop_group, period_start=date_from, period_end=date_to).delete()
+        ProductAssociation.objects.bulk_create(associations, batch_size=5000)
+    return len(associations)
@@ -1,7 +1,7 @@
-from django_filters import CharFilter
+from django_filters import CharFilter, ChoiceFilter, DateFilter, NumberFilter
 from django_filters.rest_framework import FilterSet, OrderingFilter
 
-from receipts.models import Supplier, Terminal
+from receipts.models import PriceAnomaly, Supplier, Terminal
 
 
 class SupplierFilter(FilterSet):
@@ -11,7 +11,7 @@ class SupplierFilter(FilterSet):
 
     class Meta:
         model = Supplier
-        fields = "__all__"
+        exclude = ["updated_at"]
 
 
 class TerminalFilter(FilterSet):
@@ -22,4 +22,27 @@ class TerminalFilter(FilterSet):
 
     class Meta:
         model = Terminal
-        fields = "__all__"
+        exclude = ["updated_at"]
+
+
+class PriceAnomalyFilter(FilterSet):
+    date_from = DateFilter(field_name="date", lookup_expr="date__gte")
+    date_to = DateFilter(field_name="date", lookup_expr="date__lte")
+    shop = NumberFilter(field_name="shop_id", lookup_expr="exact")
+    product = NumberFilter(field_name="product_id", lookup_expr="exact")
+    metric = ChoiceFilter(field_name="metric", choices=PriceAnomaly.METRICS)
+    score__gte = NumberFilter(field_name="score", lookup_expr="gte")
+
+    ordering = OrderingFilter(
+        fields=(
+            ("id", "id"),
+            ("date", "date"),
+            ("score", "score"),
+            ("shop__name", "shop"),
+            ("product__name", "product"),
+        )
+    )
+
+    class Meta:
+        model = PriceAnomaly
+        fields = ["date_from", "date_to", "shop", "product", "metric", "score__gte"]
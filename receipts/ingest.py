@@ -0,0 +1,125 @@
+"""
+Bulk ingestion of receipts posted by terminals.
+"""
+from datetime import datetime
+
+import psycopg2.extras as extras
+from django.db import connection, transaction
+from pydantic import BaseModel, Extra, PositiveInt, condecimal, conlist, constr
+
+from datawiz_project.fields import max_value, to_minor_units
+from receipts.models import MONEY_PLACES, QUANTITY_PLACES
+from receipts.rollups import add_receipts_to_rollup
+
+MAX_BATCH_SIZE = 5000
+
+
+# values with more decimal places than are stored are rejected instead of being rounded silently, as well as values
+# that do not fit into integer columns of minor units (like "out_of_range" rejects of the loader)
+Money = condecimal(ge=-max_value(MONEY_PLACES), le=max_value(MONEY_PLACES), max_digits=12, decimal_places=MONEY_PLACES)
+NonNegativeMoney = condecimal(ge=0, le=max_value(MONEY_PLACES), max_digits=12, decimal_places=MONEY_PLACES)
+Quantity = condecimal(ge=0, le=max_value(QUANTITY_PLACES), max_digits=12, decimal_places=QUANTITY_PLACES)
+
+
+class CartItemPayload(BaseModel):
+    class Config:
+        extra = Extra.forbid
+
+    product_id: PositiveInt
+    supplier_id: PositiveInt
+    price: NonNegativeMoney
+    original_price: NonNegativeMoney
+    qty: Quantity
+    total_price: Money
+    margin_price_total: Money
+
+
+class ReceiptPayload(BaseModel):
+    class Config:
+        extra = Extra.forbid
+
+    id: constr(min_length=1, max_length=64)
+    date: datetime
+    items: conlist(CartItemPayload, min_items=1)
+
+
+class ReceiptsBatch(BaseModel):
+    class Config:
+        extra = Extra.forbid
+
+    receipts: conlist(ReceiptPayload, min_items=1, max_items=MAX_BATCH_SIZE)
+
+
+INSERT_RECEIPTS_QUERY = """
+    INSERT INTO receipts_receipt (external_id, date, shop_id, terminal_id) VALUES %s
+    ON CONFLICT (terminal_id, external_id) DO NOTHING
+    RETURNING id, external_id
+"""
+
+INSERT_CART_ITEMS_QUERY = """
+    INSERT INTO receipts_cartitem (
+        receipt_id, product_id, supplier_id, date, price, original_price, qty, total_price, margin_price_total
+    ) VALUES %s
+"""
+
+
+def missing_ids(cursor, table, ids):
+    cursor.execute(f"SELECT id FROM {table} WHERE id = ANY(%s)", [list(ids)])
+    return sorted(set(ids) - {row[0] for row in cursor.fetchall()})
+
+
+def ingest_receipts(terminal, batch):
+    """
+    Stores receipts of the terminal with their cart items in one transaction. Receipts whose ids were
+    already uploaded by the terminal are skipped.
+    :param terminal: Terminal instance
+    :param batch: validated ReceiptsBatch
+    :return: dict with numbers of created and skipped receipts, or dict of unknown foreign keys
+    """
+    # the same receipt may be repeated inside one batch, first occurrence wins
+    unique_receipts = {}
+    for receipt in batch.receipts:
+        unique_receipts.setdefault(receipt.id, receipt)
+    receipts = list(unique_receipts.values())
+    items = [item for receipt in receipts for item in receipt.items]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        unknown = {
+            "product_id": missing_ids(cursor, "products_product", {item.product_id for item in items}),
+            "supplier_id": missing_ids(cursor, "receipts_supplier", {item.supplier_id for item in items}),
+        }
+        if any(unknown.values()):
+            return {"unknown": {key: value for key, value in unknown.items() if value}}
+
+        created = dict(
+            (external_id, receipt_id)
+            for receipt_id, external_id in extras.execute_values(
+                cursor,
+                INSERT_RECEIPTS_QUERY,
+                [(receipt.id, receipt.date, terminal.shop_id, terminal.id) for receipt in receipts],
+                page_size=len(receipts),
+                fetch=True,
+            )
+        )
+
+        rows = [
+            (
+                created[receipt.id],
+                item.product_id,
+                item.supplier_id,
+                receipt.date,
+                to_minor_units(item.price, MONEY_PLACES),
+                to_minor_units(item.original_price, MONEY_PLACES),
+                to_minor_units(item.qty, QUANTITY_PLACES),
+                to_minor_units(item.total_price, MONEY_PLACES),
+                to_minor_units(item.margin_price_total, MONEY_PLACES),
+            )
+            for receipt in receipts
+            if receipt.id in created
+            for item in receipt.items
+        ]
+        if rows:
+            extras.execute_values(cursor, INSERT_CART_ITEMS_QUERY, rows, page_size=1000)
+            add_receipts_to_rollup(cursor, list(created.values()))
+
+    return {"created": len(created), "skipped": len(batch.receipts) - len(created)}
@@ -0,0 +1,46 @@
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from receipts.basket import compute_associations
+from shops.models import ShopGroup
+
+
+class Command(BaseCommand):
+    help = "Computes product pairs co-occurrence, support, confidence and lift per shop group and period"
+
+    def add_arguments(self, parser):
+        parser.add_argument("date_from", type=date.fromisoformat, help="First day of the period (YYYY-MM-DD)")
+        parser.add_argument("date_to", type=date.fromisoformat, help="Last day of the period (YYYY-MM-DD)")
+        parser.add_argument(
+            "--shop-group",
+            type=int,
+            nargs="+",
+            help="Shop groups to compute associations for (whole subtrees), root groups by default",
+        )
+        parser.add_argument("--min-support", type=float, default=0.001, help="Minimal share of receipts with pair")
+        parser.add_argument("--partition-days", type=int, default=1, help="Days processed by one worker task")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+        parser.add_argument("--chunk-size", type=int, default=100000, help="Rows fetched from database at once")
+
+    def handle(self, *args, **options):
+        if options["date_from"] > options["date_to"]:
+            raise CommandError("date_to can not be earlier than date_from")
+
+        if options["shop_group"]:
+            shop_groups = ShopGroup.objects.filter(id__in=options["shop_group"])
+        else:
+            shop_groups = ShopGroup.objects.filter(parent=None)
+
+        for shop_group in shop_groups:
+            stored = compute_associations(
+                shop_group,
+                options["date_from"],
+                options["date_to"],
+                min_support=options["min_support"],
+                partition_days=options["partition_days"],
+                workers=options["workers"],
+                chunk_size=options["chunk_size"],
+            )
+            self.stdout.write(f"{shop_group.name}: {stored} associations stored")
@@ -0,0 +1,56 @@
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from receipts.anomalies import detect_anomalies
+from receipts.basket import subtree_shop_ids
+from shops.models import Shop, ShopGroup
+
+
+class Command(BaseCommand):
+    help = "Flags cart items whose discount depth or margin rate is an outlier for the product in the shop"
+
+    def add_arguments(self, parser):
+        parser.add_argument("date_from", type=date.fromisoformat, help="First day of the period (YYYY-MM-DD)")
+        parser.add_argument(
+            "date_to", type=date.fromisoformat, nargs="?", help="Last day of the period, date_from by default"
+        )
+        parser.add_argument(
+            "--shop-group", type=int, nargs="+", help="Shop groups to check (whole subtrees), all shops by default"
+        )
+        parser.add_argument("--window-days", type=int, default=28, help="Days preceding every day used as baseline")
+        parser.add_argument("--threshold", type=float, default=3.5, help="Minimal flagged distance in scaled MADs")
+        parser.add_argument("--min-baseline", type=int, default=10, help="Minimal number of baseline cart items")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+        parser.add_argument("--chunk-size", type=int, default=100000, help="Rows fetched from database at once")
+
+    def handle(self, *args, **options):
+        date_to = options["date_to"] or options["date_from"]
+        if options["date_from"] > date_to:
+            raise CommandError("date_to can not be earlier than date_from")
+        if options["window_days"] < 1:
+            raise CommandError("--window-days has to be positive")
+
+        if options["shop_group"]:
+            shops = sorted(
+                {
+                    shop
+                    for group in ShopGroup.objects.filter(id__in=options["shop_group"])
+                    for shop in subtree_shop_ids(group)
+                }
+            )
+        else:
+            shops = list(Shop.objects.values_list("id", flat=True))
+
+        stored = detect_anomalies(
+            shops,
+            options["date_from"],
+            date_to,
+            window_days=options["window_days"],
+            threshold=options["threshold"],
+            min_baseline=options["min_baseline"],
+            workers=options["workers"],
+            chunk_size=options["chunk_size"],
+        )
+        self.stdout.write(f"{stored} anomalies stored")
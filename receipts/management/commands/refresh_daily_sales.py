@@ -0,0 +1,17 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from receipts.rollups import refresh_daily_sales
+
+
+class Command(BaseCommand):
+    help = "Rebuilds daily sales rollup of cart items (for the whole history or the range of days)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date-from", type=date.fromisoformat, help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--date-to", type=date.fromisoformat, help="Last day to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        rows = refresh_daily_sales(options["date_from"], options["date_to"])
+        self.stdout.write(f"daily sales: {rows} rows stored")
@@ -0,0 +1,37 @@
+import multiprocessing
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from receipts.reports import work
+
+
+class Command(BaseCommand):
+    help = "Runs pool of worker processes executing queued analytics reports"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between checks of empty queue")
+        parser.add_argument("--once", action="store_true", help="Stop when the queue is empty")
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1:
+            raise CommandError("--workers has to be positive")
+
+        if options["workers"] == 1:
+            executed = work(options["poll_interval"], options["once"])
+            self.stdout.write(f"{executed} reports executed")
+            return
+
+        # forked workers must not share connection of the parent process
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=work, args=(options["poll_interval"], options["once"]), daemon=True)
+            for _ in range(options["workers"])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0008_product_dim"),
+        ("receipts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cartitem",
+            index=models.Index(fields=["date"], name="cartitem_date_idx"),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0008_product_dim"),
+        ("receipts", "0002_cartitem_date_index"),
+        ("shops", "0002_auto_20230503_1443"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductAssociation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("period_start", models.DateField()),
+                ("period_end", models.DateField()),
+                ("receipts", models.BigIntegerField()),
+                ("support", models.FloatField()),
+                ("confidence", models.FloatField()),
+                ("lift", models.FloatField()),
+                (
+                    "associated_product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="products.product",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="products.product",
+                    ),
+                ),
+                (
+                    "shop_group",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="shops.shopgroup",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["shop_group", "product", "period_end", "-lift"],
+                        name="product_association_lookup_idx",
+                    )
+                ],
+            },
+        ),
+    ]
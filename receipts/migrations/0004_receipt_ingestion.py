@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0008_product_dim"),
+        ("receipts", "0003_product_association"),
+        ("shops", "0002_auto_20230503_1443"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("revenue", models.FloatField()),
+                ("qty", models.FloatField()),
+                ("margin", models.FloatField()),
+                ("lines", models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="receipt",
+            name="external_id",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name="cartitem",
+            name="date",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name="receipt",
+            name="date",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddConstraint(
+            model_name="receipt",
+            constraint=models.UniqueConstraint(
+                fields=("terminal", "external_id"),
+                name="receipt_terminal_external_id_unique",
+            ),
+        ),
+        migrations.AddField(
+            model_name="dailysales",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="products.product",
+            ),
+        ),
+        migrations.AddField(
+            model_name="dailysales",
+            name="shop",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="shops.shop",
+            ),
+        ),
+        migrations.AddField(
+            model_name="dailysales",
+            name="supplier",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="receipts.supplier",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailysales",
+            constraint=models.UniqueConstraint(
+                fields=("day", "shop", "product", "supplier"), name="daily_sales_unique"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("receipts", "0004_receipt_ingestion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="supplier",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name="terminal",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
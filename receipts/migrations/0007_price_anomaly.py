@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0009_updated_at"),
+        ("receipts", "0006_report_job"),
+        ("shops", "0003_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceAnomaly",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateTimeField()),
+                (
+                    "metric",
+                    models.CharField(
+                        choices=[
+                            ("discount_depth", "discount_depth"),
+                            ("margin_rate", "margin_rate"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("value", models.FloatField()),
+                ("baseline_median", models.FloatField()),
+                ("baseline_mad", models.FloatField()),
+                ("baseline_size", models.IntegerField()),
+                ("score", models.FloatField()),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+                (
+                    "cart_item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="receipts.cartitem",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="products.product",
+                    ),
+                ),
+                (
+                    "shop",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="shops.shop",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["date"], name="price_anomaly_date_idx"),
+                    models.Index(
+                        fields=["shop", "date"], name="price_anomaly_shop_idx"
+                    ),
+                    models.Index(
+                        fields=["product", "date"], name="price_anomaly_product_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:11
+
+import datawiz_project.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("receipts", "0007_price_anomaly"),
+    ]
+
+    # values are converted to integer minor units (cents, thousandths) through numeric, so that e.g. 72.57 stored
+    # as 72.569999... becomes exactly 7257; all columns of a table are converted by one ALTER TABLE, so the fact
+    # table is rewritten only once
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql="""
+                        ALTER TABLE receipts_cartitem
+                            ALTER COLUMN price TYPE integer USING ROUND(price::numeric * 100)::integer,
+                            ALTER COLUMN original_price TYPE integer USING ROUND(original_price::numeric * 100)::integer,
+                            ALTER COLUMN qty TYPE integer USING ROUND(qty::numeric * 1000)::integer,
+                            ALTER COLUMN total_price TYPE integer USING ROUND(total_price::numeric * 100)::integer,
+                            ALTER COLUMN margin_price_total TYPE integer USING ROUND(margin_price_total::numeric * 100)::integer;
+                        ALTER TABLE receipts_dailysales
+                            ALTER COLUMN revenue TYPE bigint USING ROUND(revenue::numeric * 100)::bigint,
+                            ALTER COLUMN qty TYPE bigint USING ROUND(qty::numeric * 1000)::bigint,
+                            ALTER COLUMN margin TYPE bigint USING ROUND(margin::numeric * 100)::bigint;
+                    """,
+                    reverse_sql="""
+                        ALTER TABLE receipts_cartitem
+                            ALTER COLUMN price TYPE double precision USING price / 100.0,
+                            ALTER COLUMN original_price TYPE double precision USING original_price / 100.0,
+                            ALTER COLUMN qty TYPE double precision USING qty / 1000.0,
+                            ALTER COLUMN total_price TYPE double precision USING total_price / 100.0,
+                            ALTER COLUMN margin_price_total TYPE double precision USING margin_price_total / 100.0;
+                        ALTER TABLE receipts_dailysales
+                            ALTER COLUMN revenue TYPE double precision USING revenue / 100.0,
+                            ALTER COLUMN qty TYPE double precision USING qty / 1000.0,
+                            ALTER COLUMN margin TYPE double precision USING margin / 100.0;
+                    """,
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="cartitem",
+                    name="margin_price_total",
+                    field=datawiz_project.fields.MinorUnitsField(decimal_places=2),
+                ),
+                migrations.AlterField(
+                    model_name="cartitem",
+                    name="original_price",
+                    field=datawiz_project.fields.MinorUnitsField(decimal_places=2),
+                ),
+                migrations.AlterField(
+                    model_name="cartitem",
+                    name="price",
+                    field=datawiz_project.fields.MinorUnitsField(decimal_places=2),
+                ),
+                migrations.AlterField(
+                    model_name="cartitem",
+                    name="qty",
+                    field=datawiz_project.fields.MinorUnitsField(decimal_places=3),
+                ),
+                migrations.AlterField(
+                    model_name="cartitem",
+                    name="total_price",
+                    field=datawiz_project.fields.MinorUnitsField(decimal_places=2),
+                ),
+                migrations.AlterField(
+                    model_name="dailysales",
+                    name="margin",
+                    field=datawiz_project.fields.BigMinorUnitsField(decimal_places=2),
+                ),
+                migrations.AlterField(
+                    model_name="dailysales",
+                    name="qty",
+                    field=datawiz_project.fields.BigMinorUnitsField(decimal_places=3),
+                ),
+                migrations.AlterField(
+                    model_name="dailysales",
+                    name="revenue",
+                    field=datawiz_project.fields.BigMinorUnitsField(decimal_places=2),
+                ),
+            ],
+        ),
+    ]
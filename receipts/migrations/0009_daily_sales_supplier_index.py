@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0009_updated_at"),
+        ("receipts", "0008_minor_units"),
+        ("shops", "0003_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="dailysales",
+            index=models.Index(
+                fields=["supplier", "day"],
+                include=("shop", "product", "revenue", "qty", "margin", "lines"),
+                name="daily_sales_supplier_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("receipts", "0009_daily_sales_supplier_index"),
+        ("shops", "0003_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="receipt",
+            index=models.Index(
+                fields=["terminal", "date"], name="receipt_terminal_date_idx"
+            ),
+        ),
+    ]
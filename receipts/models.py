@@ -1,31 +1,169 @@
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
+from datawiz_project.fields import BigMinorUnitsField, MinorUnitsField
 from products.models import Product
-from shops.models import Shop
+from shops.models import Shop, ShopGroup
+
+# money is stored in cents and quantity in thousandths (integer minor units)
+MONEY_PLACES = 2
+QUANTITY_PLACES = 3
 
 
 class Terminal(models.Model):
     name = models.CharField(max_length=255)
     shop = models.ForeignKey(Shop, on_delete=models.PROTECT)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
 
 class Receipt(models.Model):
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(default=timezone.now)
     shop = models.ForeignKey(Shop, on_delete=models.PROTECT)
     terminal = models.ForeignKey(Terminal, on_delete=models.PROTECT)
+    # receipt id assigned by the terminal, makes repeated uploads of the same receipt idempotent
+    external_id = models.CharField(max_length=64, blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["terminal", "external_id"], name="receipt_terminal_external_id_unique")
+        ]
+        indexes = [models.Index(fields=["terminal", "date"], name="receipt_terminal_date_idx")]
 
 
 class Supplier(models.Model):
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
 
 class CartItem(models.Model):
     receipt = models.ForeignKey(Receipt, on_delete=models.PROTECT)
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     supplier = models.ForeignKey(Supplier, on_delete=models.PROTECT)
-    date = models.DateTimeField(auto_now_add=True)
-    price = models.FloatField()
-    original_price = models.FloatField()
-    qty = models.FloatField()
-    total_price = models.FloatField()
-    margin_price_total = models.FloatField()
+    date = models.DateTimeField(default=timezone.now)
+    price = MinorUnitsField(decimal_places=MONEY_PLACES)
+    original_price = MinorUnitsField(decimal_places=MONEY_PLACES)
+    qty = MinorUnitsField(decimal_places=QUANTITY_PLACES)
+    total_price = MinorUnitsField(decimal_places=MONEY_PLACES)
+    margin_price_total = MinorUnitsField(decimal_places=MONEY_PLACES)
+
+    class Meta:
+        indexes = [models.Index(fields=["date"], name="cartitem_date_idx")]
+
+
+class ProductAssociation(models.Model):
+    """
+    Market-basket statistics of product pair in receipts of shop group subtree for the period,
+    computed by "compute_market_basket" command
+    """
+
+    shop_group = models.ForeignKey(ShopGroup, on_delete=models.CASCADE)
+    period_start = models.DateField()
+    period_end = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    associated_product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    receipts = models.BigIntegerField()
+    support = models.FloatField()
+    confidence = models.FloatField()
+    lift = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["shop_group", "product", "period_end", "-lift"], name="product_association_lookup_idx"
+            ),
+        ]
+
+
+class DailySales(models.Model):
+    """
+    Daily rollup of cart items, rebuilt by "refresh_daily_sales" command and updated incrementally by receipts ingestion
+    """
+
+    day = models.DateField()
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="+")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name="+")
+    revenue = BigMinorUnitsField(decimal_places=MONEY_PLACES)
+    qty = BigMinorUnitsField(decimal_places=QUANTITY_PLACES)
+    margin = BigMinorUnitsField(decimal_places=MONEY_PLACES)
+    lines = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "shop", "product", "supplier"], name="daily_sales_unique")
+        ]
+        indexes = [
+            # covering index: supplier analytics read only the index (index-only scan) instead of heap rows
+            # of the supplier scattered over the whole table
+            models.Index(
+                fields=["supplier", "day"],
+                include=["shop", "product", "revenue", "qty", "margin", "lines"],
+                name="daily_sales_supplier_idx",
+            ),
+        ]
+
+
+class ReportJob(models.Model):
+    """
+    Analytics report computed in background by "run_report_workers" command. There is one job per report
+    parameters hash, so identical requests share the job and its result until it expires
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [(PENDING, PENDING), (RUNNING, RUNNING), (DONE, DONE), (FAILED, FAILED)]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    report = models.CharField(max_length=64)
+    params = models.JSONField(encoder=DjangoJSONEncoder)
+    params_hash = models.CharField(max_length=64, unique=True)
+    status = models.CharField(max_length=16, choices=STATUSES, default=PENDING)
+    result = models.JSONField(encoder=DjangoJSONEncoder, blank=True, null=True)
+    result_size = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    expires_at = models.DateTimeField(blank=True, null=True)
+    accessed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="report_job_queue_idx"),
+        ]
+
+
+class PriceAnomaly(models.Model):
+    """
+    Cart item whose discount depth or margin rate is an outlier against the trailing window of the same product
+    in the same shop, found by "detect_price_anomalies" command
+    """
+
+    DISCOUNT_DEPTH = "discount_depth"
+    MARGIN_RATE = "margin_rate"
+    METRICS = [(DISCOUNT_DEPTH, DISCOUNT_DEPTH), (MARGIN_RATE, MARGIN_RATE)]
+
+    cart_item = models.ForeignKey(CartItem, on_delete=models.CASCADE, related_name="+")
+    date = models.DateTimeField()
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="+")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    metric = models.CharField(max_length=32, choices=METRICS)
+    value = models.FloatField()
+    # robust statistics of the metric in the trailing window ("score" is the distance from median in scaled MADs)
+    baseline_median = models.FloatField()
+    baseline_mad = models.FloatField()
+    baseline_size = models.IntegerField()
+    score = models.FloatField()
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["date"], name="price_anomaly_date_idx"),
+            models.Index(fields=["shop", "date"], name="price_anomaly_shop_idx"),
+            models.Index(fields=["product", "date"], name="price_anomaly_product_idx"),
+        ]
@@ -0,0 +1,176 @@
+"""
+Background execution of heavy analytics reports. Report requests are queued as ReportJob rows, computed by
+"run_report_workers" processes and results are cached by hash of report parameters, so identical requests
+(also concurrent ones) are served by one computation. Every tenant has its own queue (ReportJob table of its
+schema), workers serve all of them.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from datawiz_project.tenants import activate, tenant_schemas
+from receipts import analytics
+from receipts.models import ReportJob
+from receipts.serializers import REPORT_PARAMS_SERIALIZERS
+
+REPORT_FUNCTIONS = {
+    "top-products": analytics.top_products,
+    "abc": analytics.abc_analysis,
+    "period-comparison": analytics.period_comparison,
+    "hierarchy-rollup": analytics.hierarchy_rollup,
+}
+
+# seconds between evictions of expired and oversized results done by every worker
+EVICTION_INTERVAL = 60
+
+# least recently accessed results are deleted until the total size of the rest fits into the limit
+EVICT_OVERSIZED_QUERY = """
+    DELETE FROM receipts_reportjob
+    WHERE id IN (
+        SELECT id
+        FROM (
+            SELECT id, SUM(result_size) OVER (ORDER BY accessed_at DESC, id) AS cached_size
+            FROM receipts_reportjob
+            WHERE status = %(done)s
+        ) AS results
+        WHERE cached_size > %(max_bytes)s
+    )
+"""
+
+
+def hash_params(report, params):
+    """
+    Hash of validated report params (defaults included, so omitted and explicitly default params are equal)
+    """
+    encoded = json.dumps({"report": report, "params": params}, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def submit_report(report, params):
+    """
+    Returns the job of report with given params: cached result, job that is already queued or running,
+    or newly queued job. Expired and failed jobs are queued again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # the row lock serializes concurrent submits of the same report, unique hash makes them share one job
+        job, created = ReportJob.objects.select_for_update().get_or_create(
+            params_hash=hash_params(report, params), defaults={"report": report, "params": params}
+        )
+        if created:
+            return job
+
+        if job.status == ReportJob.FAILED or (job.status == ReportJob.DONE and job.expires_at <= now):
+            job.status = ReportJob.PENDING
+            job.result, job.result_size, job.error = None, 0, ""
+            job.created_at, job.started_at, job.finished_at, job.expires_at = now, None, None, None
+            job.save()
+        elif job.status == ReportJob.DONE:
+            job.accessed_at = now
+            job.save(update_fields=["accessed_at"])
+    return job
+
+
+def claim_job():
+    """
+    Marks the oldest queued job as running, jobs locked by other workers are skipped
+    """
+    with transaction.atomic():
+        job = (
+            ReportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ReportJob.PENDING)
+            .order_by("created_at")
+            .first()
+        )
+        if job is not None:
+            job.status, job.started_at = ReportJob.RUNNING, timezone.now()
+            job.save(update_fields=["status", "started_at"])
+    return job
+
+
+def execute_job(job):
+    running = ReportJob.objects.filter(pk=job.pk, status=ReportJob.RUNNING)
+    try:
+        serializer = REPORT_PARAMS_SERIALIZERS[job.report](data=job.params)
+        serializer.is_valid(raise_exception=True)
+        result = REPORT_FUNCTIONS[job.report](serializer.validated_data)
+    except Exception as error:
+        running.update(status=ReportJob.FAILED, error=repr(error), finished_at=timezone.now())
+        return
+
+    # result is stored exactly as synchronous endpoints render it (e.g. decimals as numbers)
+    rendered = JSONRenderer().render(result)
+    now = timezone.now()
+    running.update(
+        status=ReportJob.DONE,
+        result=json.loads(rendered),
+        result_size=len(rendered),
+        finished_at=now,
+        expires_at=now + timedelta(seconds=settings.REPORT_RESULT_TTL),
+        accessed_at=now,
+    )
+
+
+def evict_results():
+    """
+    Deletes expired results and failed jobs, least recently accessed results over the cache size limit,
+    and queues again jobs whose workers died
+    :return: (number of deleted jobs, number of queued again jobs)
+    """
+    now = timezone.now()
+    deleted, _ = ReportJob.objects.filter(
+        Q(status=ReportJob.DONE, expires_at__lte=now)
+        | Q(status=ReportJob.FAILED, finished_at__lte=now - timedelta(seconds=settings.REPORT_RESULT_TTL))
+    ).delete()
+
+    with connection.cursor() as cursor:
+        cursor.execute(EVICT_OVERSIZED_QUERY, {"done": ReportJob.DONE, "max_bytes": settings.REPORT_CACHE_MAX_BYTES})
+        deleted += cursor.rowcount
+
+    requeued = ReportJob.objects.filter(
+        status=ReportJob.RUNNING, started_at__lt=now - timedelta(seconds=settings.REPORT_JOB_TIMEOUT)
+    ).update(status=ReportJob.PENDING, started_at=None)
+    return deleted, requeued
+
+
+def work(poll_interval=1.0, once=False):
+    """
+    Worker loop: executes queued jobs of all datasets ("public" schema and schemas of tenants) one by one,
+    taking one job of every dataset in turn, waits poll_interval seconds when all queues are empty
+    :param once: stop when all queues are empty
+    :return: number of executed jobs
+    """
+    executed = 0
+    # the first iteration loads schemas and evicts, monotonic clock may start near zero (e.g. after boot)
+    evicted_at = float("-inf")
+    schemas = []
+    while True:
+        if time.monotonic() - evicted_at > EVICTION_INTERVAL:
+            # list of tenants is refreshed together with evictions
+            schemas = tenant_schemas()
+            for schema in schemas:
+                with activate(schema):
+                    evict_results()
+            evicted_at = time.monotonic()
+
+        claimed = 0
+        for schema in schemas:
+            with activate(schema):
+                job = claim_job()
+                if job is not None:
+                    execute_job(job)
+                    claimed += 1
+        executed += claimed
+        if claimed:
+            continue
+        if once:
+            return executed
+        time.sleep(poll_interval)
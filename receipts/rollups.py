@@ -0,0 +1,64 @@
+"""
+Maintenance of the "receipts_dailysales" rollup of cart items.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+
+ROLLUP_SELECT = """
+    SELECT ci.date::date AS day, r.shop_id, ci.product_id, ci.supplier_id,
+           SUM(ci.total_price), SUM(ci.qty), SUM(ci.margin_price_total), COUNT(*)
+    FROM receipts_cartitem ci
+    JOIN receipts_receipt r ON r.id = ci.receipt_id
+    {where}
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+"""
+
+ROLLUP_INSERT = """
+    INSERT INTO receipts_dailysales (day, shop_id, product_id, supplier_id, revenue, qty, margin, lines)
+"""
+
+# rows are inserted in the order of the unique key, so concurrent upserts lock rollup rows in the same order
+ROLLUP_UPSERT = (
+    ROLLUP_INSERT
+    + ROLLUP_SELECT
+    + """
+    ON CONFLICT (day, shop_id, product_id, supplier_id) DO UPDATE SET
+        revenue = receipts_dailysales.revenue + EXCLUDED.revenue,
+        qty = receipts_dailysales.qty + EXCLUDED.qty,
+        margin = receipts_dailysales.margin + EXCLUDED.margin,
+        lines = receipts_dailysales.lines + EXCLUDED.lines
+"""
+)
+
+
+def where_clause(conditions):
+    return ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+
+def add_receipts_to_rollup(cursor, receipt_ids):
+    """
+    Adds cart items of newly inserted receipts to the rollup
+    """
+    cursor.execute(ROLLUP_UPSERT.format(where="WHERE ci.receipt_id = ANY(%s)"), [receipt_ids])
+
+
+def refresh_daily_sales(date_from=None, date_to=None):
+    """
+    Rebuilds the rollup for days in the range (inclusive), the whole rollup is rebuilt without range
+    """
+    rollup_conditions, cart_item_conditions, params = [], [], []
+    if date_from:
+        rollup_conditions.append("day >= %s")
+        cart_item_conditions.append("ci.date >= %s")
+        params.append(date_from)
+    if date_to:
+        rollup_conditions.append("day < %s")
+        cart_item_conditions.append("ci.date < %s")
+        params.append(date_to + timedelta(days=1))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM receipts_dailysales {where_clause(rollup_conditions)}", params)
+        cursor.execute(ROLLUP_INSERT + ROLLUP_SELECT.format(where=where_clause(cart_item_conditions)), params)
+        return cursor.rowcount
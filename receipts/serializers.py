@@ -1,18 +1,164 @@
-from rest_framework.serializers import ModelSerializer
+from django.utils.translation import gettext_lazy as _
+from rest_framework.serializers import (CharField, ChoiceField, DateField,
+                                        DictField, FloatField, IntegerField,
+                                        ModelSerializer, Serializer,
+                                        ValidationError)
 
-from receipts.models import Supplier, Terminal
+from datawiz_project.serializers import DynamicFieldsModelSerializer
+from products.serializers import ProductSerializer
+from receipts.analytics import (COMPARISON_GROUPS, DAILY_SALES_METRICS,
+                                HEATMAP_GROUPS, METRICS, ROLLUP_TREES)
+from receipts.models import (PriceAnomaly, ProductAssociation, ReportJob,
+                             Supplier, Terminal)
 from shops.serializers import ShopSerializer
 
 
-class SupplierSerializer(ModelSerializer):
+class SupplierSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Supplier
         fields = "__all__"
 
 
-class TerminalSerializer(ModelSerializer):
+class TerminalSerializer(DynamicFieldsModelSerializer):
     shop = ShopSerializer()
 
     class Meta:
         model = Terminal
         fields = "__all__"
+
+
+class PriceAnomalySerializer(DynamicFieldsModelSerializer):
+    shop = ShopSerializer()
+    product = ProductSerializer()
+
+    class Meta:
+        model = PriceAnomaly
+        fields = "__all__"
+
+
+class SalesScopeSerializer(Serializer):
+    shop = IntegerField(required=False, min_value=1)
+    shop_group = IntegerField(required=False, min_value=1)
+    category = IntegerField(required=False, min_value=1)
+
+
+class SalesFilterSerializer(SalesScopeSerializer):
+    date_from = DateField(required=False)
+    date_to = DateField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get("date_from") and attrs.get("date_to") and attrs["date_from"] > attrs["date_to"]:
+            raise ValidationError({"date_to": _("Кінцева дата не може бути раніше початкової.")})
+        return attrs
+
+
+class TopProductsSerializer(SalesFilterSerializer):
+    metric = ChoiceField(choices=list(METRICS), default="revenue")
+    limit = IntegerField(min_value=1, max_value=1000, default=10)
+    a_threshold = FloatField(min_value=0, max_value=1, default=0.8)
+    b_threshold = FloatField(min_value=0, max_value=1, default=0.95)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if attrs["a_threshold"] > attrs["b_threshold"]:
+            raise ValidationError({"b_threshold": _("Поріг класу B не може бути меншим за поріг класу A.")})
+        return attrs
+
+
+class ABCAnalysisSerializer(TopProductsSerializer):
+    abc_class = ChoiceField(choices=["A", "B", "C"], required=False)
+
+
+class PeriodComparisonSerializer(SalesScopeSerializer):
+    current_from = DateField()
+    current_to = DateField()
+    previous_from = DateField()
+    previous_to = DateField()
+    group_by = ChoiceField(choices=list(COMPARISON_GROUPS), default="total")
+
+    def validate(self, attrs):
+        for period in ("current", "previous"):
+            if attrs[f"{period}_from"] > attrs[f"{period}_to"]:
+                raise ValidationError({f"{period}_to": _("Кінцева дата не може бути раніше початкової.")})
+        return attrs
+
+
+class SalesPeriodSerializer(SalesFilterSerializer):
+    date_from = DateField()
+    date_to = DateField()
+
+
+class HierarchyRollupSerializer(SalesPeriodSerializer):
+    tree = ChoiceField(choices=list(ROLLUP_TREES), default="shop_group")
+    max_level = IntegerField(required=False, min_value=1)
+
+
+class SupplierRankingSerializer(SalesPeriodSerializer):
+    metric = ChoiceField(choices=list(DAILY_SALES_METRICS), default="revenue")
+    limit = IntegerField(min_value=1, max_value=1000, default=50)
+
+
+class TerminalHeatmapSerializer(Serializer):
+    terminal = IntegerField(required=False, min_value=1)
+    shop = IntegerField(required=False, min_value=1)
+    shop_group = IntegerField(required=False, min_value=1)
+    date_from = DateField()
+    date_to = DateField()
+    group_by = ChoiceField(choices=list(HEATMAP_GROUPS), default="terminal")
+
+    def validate(self, attrs):
+        if attrs["date_from"] > attrs["date_to"]:
+            raise ValidationError({"date_to": _("Кінцева дата не може бути раніше початкової.")})
+        return attrs
+
+
+class FrequentlyBoughtWithSerializer(Serializer):
+    product = IntegerField(min_value=1)
+    shop_group = IntegerField(min_value=1)
+    period_end = DateField(required=False)
+    order_by = ChoiceField(choices=["lift", "confidence", "support"], default="lift")
+    limit = IntegerField(min_value=1, max_value=100, default=10)
+
+
+class ProductAssociationSerializer(ModelSerializer):
+    associated_product_name = CharField(source="associated_product.name")
+
+    class Meta:
+        model = ProductAssociation
+        fields = [
+            "associated_product",
+            "associated_product_name",
+            "period_start",
+            "period_end",
+            "receipts",
+            "support",
+            "confidence",
+            "lift",
+        ]
+
+
+# reports that can be computed in background (see receipts.reports) -> serializer of their params
+REPORT_PARAMS_SERIALIZERS = {
+    "top-products": TopProductsSerializer,
+    "abc": ABCAnalysisSerializer,
+    "period-comparison": PeriodComparisonSerializer,
+    "hierarchy-rollup": HierarchyRollupSerializer,
+}
+
+
+class ReportRequestSerializer(Serializer):
+    report = ChoiceField(choices=list(REPORT_PARAMS_SERIALIZERS))
+    params = DictField(default=dict)
+
+    def validate(self, attrs):
+        params_serializer = REPORT_PARAMS_SERIALIZERS[attrs["report"]](data=attrs["params"])
+        if not params_serializer.is_valid():
+            raise ValidationError({"params": params_serializer.errors})
+        attrs["params"] = params_serializer.validated_data
+        return attrs
+
+
+class ReportJobSerializer(ModelSerializer):
+    class Meta:
+        model = ReportJob
+        fields = ["id", "report", "params", "status", "error", "created_at", "started_at", "finished_at", "expires_at"]
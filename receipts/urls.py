@@ -1,11 +1,15 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from receipts.views import SupplierViewSet, TerminalViewSet
+from receipts.views import (AnalyticsViewSet, PriceAnomalyViewSet,
+                            ReportViewSet, SupplierViewSet, TerminalViewSet)
 
 router = DefaultRouter()
 router.register(r"supplier", SupplierViewSet, basename="supplier")
 router.register(r"terminal", TerminalViewSet, basename="terminal")
+router.register(r"analytics", AnalyticsViewSet, basename="analytics")
+router.register(r"reports", ReportViewSet, basename="reports")
+router.register(r"price-anomaly", PriceAnomalyViewSet, basename="price-anomaly")
 
 
 urlpatterns = [path("", include(router.urls))]
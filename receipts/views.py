@@ -1,13 +1,35 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_filters.rest_framework import DjangoFilterBackend
+from pydantic import ValidationError as PydanticValidationError
 from rest_framework import status
+from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.viewsets import GenericViewSet
 
 from datawiz_project.paginators import CustomNumberPaginator
 from datawiz_project.viewsets import DisplayViewSet
-from receipts.filters import SupplierFilter, TerminalFilter
-from receipts.models import Supplier, Terminal
-from receipts.serializers import SupplierSerializer, TerminalSerializer
+from receipts import analytics
+from receipts.filters import PriceAnomalyFilter, SupplierFilter, TerminalFilter
+from receipts.ingest import ReceiptsBatch, ingest_receipts
+from receipts.models import (PriceAnomaly, ProductAssociation, ReportJob,
+                             Supplier, Terminal)
+from receipts.reports import hash_params, submit_report
+from receipts.serializers import (ABCAnalysisSerializer,
+                                  FrequentlyBoughtWithSerializer,
+                                  HierarchyRollupSerializer,
+                                  PeriodComparisonSerializer,
+                                  PriceAnomalySerializer,
+                                  ProductAssociationSerializer,
+                                  ReportJobSerializer, ReportRequestSerializer,
+                                  SalesPeriodSerializer,
+                                  SupplierRankingSerializer,
+                                  SupplierSerializer,
+                                  TerminalHeatmapSerializer,
+                                  TerminalSerializer, TopProductsSerializer)
 
 
 class SupplierViewSet(DisplayViewSet):
@@ -17,6 +39,21 @@ class SupplierViewSet(DisplayViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = SupplierFilter
 
+    @action(detail=True, methods=["get"], url_path="performance")
+    def performance(self, request, *args, **kwargs):
+        supplier = self.get_object()
+        serializer = SalesPeriodSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            data=analytics.supplier_performance(supplier, serializer.validated_data), status=status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=["get"], url_path="ranking")
+    def ranking(self, request, *args, **kwargs):
+        serializer = SupplierRankingSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(data=analytics.supplier_ranking(serializer.validated_data), status=status.HTTP_200_OK)
+
 
 class TerminalViewSet(DisplayViewSet):
     model = Terminal
@@ -24,12 +61,128 @@ class TerminalViewSet(DisplayViewSet):
     pagination_class = CustomNumberPaginator
     filter_backends = (DjangoFilterBackend,)
     filterset_class = TerminalFilter
+    select_related_fields = ("shop", "shop__group")
 
-    def get_queryset(self):
-        return Terminal.objects.select_related("shop", "shop__group").all()
+    @action(detail=False, methods=["get"], url_path="heatmap")
+    def heatmap(self, request, *args, **kwargs):
+        serializer = TerminalHeatmapSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        # heatmaps are cached by params for HEATMAP_CACHE_TTL, receipts of the last minutes may be missing
+        heatmaps = cache.get_or_set(
+            f"terminal-heatmap:{hash_params('terminal-heatmap', serializer.validated_data)}",
+            lambda: analytics.terminal_heatmaps(serializer.validated_data),
+            settings.HEATMAP_CACHE_TTL,
+        )
+        return Response(data=heatmaps, status=status.HTTP_200_OK)
 
-    def get_object(self):
+    @action(detail=True, methods=["post"], url_path="receipts")
+    def ingest(self, request, *args, **kwargs):
+        terminal = self.get_object()
+        # request body is parsed and validated by pydantic directly, without DRF parsers and serializers
         try:
-            return Terminal.objects.select_related("shop", "shop__group").get(pk=self.kwargs.get(self.lookup_field))
-        except Terminal.DoesNotExist:
-            raise ValidationError(detail={"detail": _("Не знайдено.")}, code=status.HTTP_400_BAD_REQUEST)
+            batch = ReceiptsBatch.parse_raw(request.body)
+        except PydanticValidationError as error:
+            raise ValidationError(detail={"detail": error.errors()})
+
+        result = ingest_receipts(terminal, batch)
+        if "unknown" in result:
+            raise ValidationError(detail={"detail": _("Невідомі товари або постачальники."), **result["unknown"]})
+        return Response(data=result, status=status.HTTP_201_CREATED if result["created"] else status.HTTP_200_OK)
+
+
+class PriceAnomalyViewSet(DisplayViewSet):
+    model = PriceAnomaly
+    serializer_class = PriceAnomalySerializer
+    pagination_class = CustomNumberPaginator
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = PriceAnomalyFilter
+    select_related_fields = ("shop__group", "product__category", "product__producer")
+
+
+class AnalyticsViewSet(GenericViewSet):
+    @action(detail=False, methods=["get"], url_path="top-products")
+    def top_products(self, request, *args, **kwargs):
+        serializer = TopProductsSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(data=analytics.top_products(serializer.validated_data), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="abc")
+    def abc(self, request, *args, **kwargs):
+        serializer = ABCAnalysisSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(data=analytics.abc_analysis(serializer.validated_data), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="period-comparison")
+    def period_comparison(self, request, *args, **kwargs):
+        serializer = PeriodComparisonSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(data=analytics.period_comparison(serializer.validated_data), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="hierarchy-rollup")
+    def hierarchy_rollup(self, request, *args, **kwargs):
+        serializer = HierarchyRollupSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(data=analytics.hierarchy_rollup(serializer.validated_data), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="frequently-bought-with")
+    def frequently_bought_with(self, request, *args, **kwargs):
+        serializer = FrequentlyBoughtWithSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        associations = ProductAssociation.objects.filter(
+            product_id=params["product"], shop_group_id=params["shop_group"]
+        )
+        # latest computed period by default
+        period_end = (
+            params.get("period_end")
+            or associations.order_by("-period_end").values_list("period_end", flat=True).first()
+        )
+        associations = (
+            associations.filter(period_end=period_end)
+            .select_related("associated_product")
+            .order_by(f"-{params['order_by']}")[: params["limit"]]
+        )
+        return Response(data=ProductAssociationSerializer(associations, many=True).data, status=status.HTTP_200_OK)
+
+
+class ReportViewSet(GenericViewSet):
+    """
+    Analytics reports computed in background: POST submits report and returns its job,
+    job is polled by id and result is downloaded from "result" action when job is done
+    """
+
+    queryset = ReportJob.objects.defer("result")
+    serializer_class = ReportJobSerializer
+
+    def get_queryset(self):
+        # result is fetched together with the status, the job may be evicted right after it is read
+        if self.action == "result":
+            return ReportJob.objects.all()
+        return super().get_queryset()
+
+    def create(self, request, *args, **kwargs):
+        serializer = ReportRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = submit_report(serializer.validated_data["report"], serializer.validated_data["params"])
+        return Response(
+            data=ReportJobSerializer(job).data,
+            status=status.HTTP_200_OK if job.status == ReportJob.DONE else status.HTTP_202_ACCEPTED,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(data=self.get_serializer(self.get_object()).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"], url_path="result")
+    def result(self, request, *args, **kwargs):
+        job = self.get_object()
+        if job.status in (ReportJob.PENDING, ReportJob.RUNNING):
+            return Response(data=self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+        if job.status == ReportJob.FAILED:
+            return Response(data=self.get_serializer(job).data, status=status.HTTP_409_CONFLICT)
+
+        # access time decides which results are evicted first when cache exceeds its size
+        ReportJob.objects.filter(pk=job.pk).update(accessed_at=timezone.now())
+        response = Response(data=job.result, status=status.HTTP_200_OK)
+        response["Content-Disposition"] = f'attachment; filename="{job.report}-{job.pk}.json"'
+        return response
@@ -0,0 +1,202 @@
+"""
+Load-test benchmark: loads every given dataset (see "manage.py generate_dataset") into an empty database,
+measures load throughput of every table and latency percentiles of every GET endpoint of the routers,
+and stores results as json for comparison across versions.
+
+Requests are sent with django test client and DEBUG turned off (no debug toolbar and query log), so latencies
+include views, serialization and database, but not the web server and network.
+All rows of the loader tables are removed before every dataset.
+
+Usage: python manage.py runscript benchmark_load --script-args <label> <data_dir> [<data_dir> ...]
+       python manage.py runscript benchmark_load --script-args compare <old_results.json> <new_results.json>
+"""
+import json
+import os
+import subprocess
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection
+from django.db.models import Max
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from datawiz_project.settings import BASE_DIR
+from products.urls import router as products_router
+from receipts.models import Receipt
+from receipts.urls import router as receipts_router
+from scripts.load import load_dataset
+from scripts.synthetic import read_manifest
+from shops.models import ShopGroup
+from shops.urls import router as shops_router
+
+RESULTS_DIR = os.path.join(BASE_DIR, "scripts/benchmark_results")
+
+REQUESTS_PER_ENDPOINT = 30
+
+PERCENTILES = (50, 90, 99)
+
+# tables are emptied before every dataset, in the order that respects foreign keys
+TABLES = (
+    "receipts_dailysales",
+    "receipts_productassociation",
+    "receipts_cartitem",
+    "receipts_receipt",
+    "receipts_supplier",
+    "receipts_terminal",
+    "shops_shop",
+    "shops_shopgroup",
+    "product_dim",
+    "products_product",
+    "products_producer",
+    "products_category",
+)
+
+
+def endpoint_params(last_day):
+    """
+    Query params of endpoints that can not be requested without them, analytics cover the last 30 days of data
+    """
+    month_ago = last_day - timedelta(days=29)
+    root_group = ShopGroup.objects.filter(parent=None).order_by("id").values_list("id", flat=True).first()
+    return {
+        "analytics-top-products": {"date_from": month_ago, "date_to": last_day},
+        "analytics-abc": {"date_from": month_ago, "date_to": last_day},
+        "analytics-period-comparison": {
+            "current_from": month_ago,
+            "current_to": last_day,
+            "previous_from": month_ago - timedelta(days=30),
+            "previous_to": month_ago - timedelta(days=1),
+            "group_by": "category",
+        },
+        "analytics-hierarchy-rollup": {"date_from": month_ago, "date_to": last_day},
+        "supplier-ranking": {"date_from": month_ago, "date_to": last_day},
+        "terminal-heatmap": {"date_from": month_ago, "date_to": last_day},
+        "analytics-frequently-bought-with": {"product": 1, "shop_group": root_group},
+    }
+
+
+def router_endpoints():
+    """
+    Yields (name, url) of list, detail and extra GET actions of every viewset registered in routers
+    """
+    for router in (products_router, receipts_router, shops_router):
+        for _, viewset, basename in router.registry:
+            if hasattr(viewset, "list"):
+                yield f"{basename}-list", reverse(f"{basename}-list")
+            # detail routes are measured on catalogue viewsets only (other objects, e.g. report jobs, are created by
+            # requests themselves)
+            if hasattr(viewset, "retrieve") and getattr(viewset, "model", None) is not None:
+                pk = viewset.model.objects.order_by("pk").values_list("pk", flat=True).first()
+                if pk is not None:
+                    yield f"{basename}-detail", reverse(f"{basename}-detail", kwargs={"pk": pk})
+            for extra_action in viewset.get_extra_actions():
+                if "get" in extra_action.mapping and not extra_action.detail:
+                    name = f"{basename}-{extra_action.url_name}"
+                    yield name, reverse(name)
+
+
+@override_settings(DEBUG=False, ALLOWED_HOSTS=["localhost"])
+def measure_endpoints():
+    client = Client(HTTP_HOST="localhost")
+    last_receipt = Receipt.objects.aggregate(last=Max("date"))["last"]
+    params = endpoint_params(last_receipt.date()) if last_receipt else {}
+
+    results = {}
+    for name, url in router_endpoints():
+        timings = []
+        for _ in range(REQUESTS_PER_ENDPOINT):
+            start = time.perf_counter()
+            response = client.get(url, params.get(name, {}))
+            timings.append(time.perf_counter() - start)
+        milliseconds = np.array(timings) * 1000
+        results[name] = {
+            "status": response.status_code,
+            **{f"p{percentile}_ms": float(np.percentile(milliseconds, percentile)) for percentile in PERCENTILES},
+            "max_ms": float(milliseconds.max()),
+        }
+        latency = results[name]
+        print(f"  {name}: {response.status_code}, p50 {latency['p50_ms']:.1f} ms, p99 {latency['p99_ms']:.1f} ms")
+    return results
+
+
+def clear_tables():
+    with connection.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+
+
+def benchmark_dataset(data_dir):
+    print(f"{data_dir}:")
+    clear_tables()
+    start = time.perf_counter()
+    load = load_dataset(data_dir)
+    load_seconds = time.perf_counter() - start
+    for step in load.values():
+        if "rows" in step:
+            step["rows_per_second"] = step["rows"] / step["seconds"] if step["seconds"] else None
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    return {
+        "data_dir": data_dir,
+        "dataset": read_manifest(data_dir),
+        "load_seconds": load_seconds,
+        "load": load,
+        "endpoints": measure_endpoints(),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    """
+    Prints relative change of load time and p50/p99 latencies between datasets of the same name
+    """
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    print(f"{old['revision']} -> {new['revision']}")
+
+    old_runs = {os.path.basename(os.path.normpath(run["data_dir"])): run for run in old["runs"]}
+    for new_run in new["runs"]:
+        dataset = os.path.basename(os.path.normpath(new_run["data_dir"]))
+        old_run = old_runs.get(dataset)
+        if old_run is None:
+            continue
+        print(f"{dataset}: load {old_run['load_seconds']:.1f} s -> {new_run['load_seconds']:.1f} s")
+        for name, latency in new_run["endpoints"].items():
+            if name not in old_run["endpoints"]:
+                continue
+            changes = ", ".join(
+                f"{key} {old_run['endpoints'][name][key]:.1f} -> {latency[key]:.1f} ms "
+                f"({(latency[key] / old_run['endpoints'][name][key] - 1) * 100:+.0f}%)"
+                for key in ("p50_ms", "p99_ms")
+            )
+            print(f"  {name}: {changes}")
+
+
+def run(*args):
+    if args[0] == "compare":
+        compare(*args[1:3])
+        return
+
+    label, data_dirs = args[0], args[1:]
+    results = {
+        "label": label,
+        "revision": git_revision(),
+        "requests_per_endpoint": REQUESTS_PER_ENDPOINT,
+        "runs": [benchmark_dataset(data_dir) for data_dir in data_dirs],
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{label}.json")
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, default=str)
+    print(f"results are stored in {path}")
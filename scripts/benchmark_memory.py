@@ -0,0 +1,89 @@
+"""
+Memory benchmark of the loader: generates seeded datasets of growing size (dimension tables grow together with
+cart items) and loads every one of them into the emptied database in a fresh process, which reports its peak
+resident set size. Memory-bounded loader keeps peak RSS flat while input files grow.
+
+Usage: python manage.py runscript benchmark_memory --script-args <cart_items> [<cart_items> ...] [<label>]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from datawiz_project.settings import BASE_DIR
+from scripts.benchmark_load import RESULTS_DIR, clear_tables, git_revision
+from scripts.synthetic import generate_dataset
+
+# number of products (and other dimension rows, see scripts.synthetic.default_scale) per cart item
+PRODUCTS_PER_CART_ITEM = 0.2
+
+
+def load_stats(data_dir, directory):
+    """
+    Loads dataset with "runscript load" in a fresh process
+    :return: stats of the load (see scripts.load.load_dataset)
+    """
+    stats_path = os.path.join(directory, "stats.json")
+    subprocess.run(
+        [
+            sys.executable,
+            os.path.join(BASE_DIR, "manage.py"),
+            "runscript",
+            "load",
+            "--script-args",
+            data_dir,
+            stats_path,
+        ],
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+    with open(stats_path) as file:
+        return json.load(file)
+
+
+def benchmark_size(cart_items, directory):
+    data_dir = os.path.join(directory, str(cart_items))
+    products = int(cart_items * PRODUCTS_PER_CART_ITEM)
+    manifest = generate_dataset(data_dir, cart_items, seed=0, products=products, producers=max(10, products // 50))
+    input_bytes = sum(os.path.getsize(os.path.join(data_dir, name)) for name in os.listdir(data_dir))
+    largest_dimension = max(
+        (os.path.getsize(os.path.join(data_dir, name)), name)
+        for name in os.listdir(data_dir)
+        if name.split(".")[0] not in ("receipt", "cartitem", "dataset")
+    )
+
+    clear_tables()
+    stats = load_stats(data_dir, directory)
+    return {
+        "cart_items": cart_items,
+        "rows": manifest["rows"],
+        "input_bytes": input_bytes,
+        "largest_dimension_file": largest_dimension[1],
+        "largest_dimension_bytes": largest_dimension[0],
+        "peak_rss_bytes": max(step["peak_rss_bytes"] for step in stats.values()),
+        "steps": stats,
+    }
+
+
+def run(*args):
+    sizes = [int(arg) for arg in args if arg.isdigit()]
+    labels = [arg for arg in args if not arg.isdigit()]
+    label = labels[0] if labels else "memory"
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for cart_items in sizes:
+            result = benchmark_size(cart_items, directory)
+            results.append(result)
+            print(
+                f"{cart_items} cart items: input {result['input_bytes'] / 2 ** 20:.1f} MiB "
+                f"({result['largest_dimension_file']} {result['largest_dimension_bytes'] / 2 ** 20:.1f} MiB), "
+                f"peak RSS {result['peak_rss_bytes'] / 2 ** 20:.1f} MiB"
+            )
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{label}.json")
+    with open(path, "w") as file:
+        json.dump({"label": label, "revision": git_revision(), "runs": results}, file, indent=2)
+    print(f"results are stored in {path}")
@@ -0,0 +1,74 @@
+"""
+Compares single-scan period comparison with the naive approach (one aggregation query per period).
+
+Usage: python manage.py runscript benchmark_period_comparison --script-args <current_from> <current_to>
+       <previous_from> <previous_to> [group_by] [repeats]
+"""
+import statistics
+import time
+from datetime import date
+
+from receipts.analytics import (COMPARISON_GROUPS, METRICS, metric_sums,
+                                period_comparison, run_query, sales_filters)
+
+
+def naive_period_comparison(filters):
+    group_joins, keys = COMPARISON_GROUPS[filters["group_by"]]
+    columns = [f"{expression} AS {name}" for expression, name in keys] + [metric_sums(METRICS)]
+    group_by = ("GROUP BY " + ", ".join(expression for expression, _ in keys)) if keys else ""
+
+    results = {}
+    for period in ("current", "previous"):
+        joins, where, params = sales_filters(
+            {"date_from": filters[f"{period}_from"], "date_to": filters[f"{period}_to"]},
+            join_receipt=filters["group_by"] == "shop",
+        )
+        query = f"""
+            SELECT {", ".join(columns)}
+            FROM receipts_cartitem ci
+            {joins}
+            {group_joins}
+            {where}
+            {group_by}
+        """
+        results[period] = {tuple(row[name] for _, name in keys): row for row in run_query(query, params)}
+
+    merged = []
+    for key in results["current"].keys() | results["previous"].keys():
+        current, previous = results["current"].get(key, {}), results["previous"].get(key, {})
+        row = dict(zip((name for _, name in keys), key))
+        for name in METRICS:
+            row[f"current_{name}"] = current.get(name) or 0
+            row[f"previous_{name}"] = previous.get(name) or 0
+            row[f"{name}_delta"] = row[f"current_{name}"] - row[f"previous_{name}"]
+        merged.append(row)
+    return merged
+
+
+def measure(function, filters, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = function(filters)
+        timings.append(time.perf_counter() - start)
+    return len(rows), timings
+
+
+def run(*args):
+    current_from, current_to, previous_from, previous_to = (date.fromisoformat(arg) for arg in args[:4])
+    group_by = args[4] if len(args) > 4 else "total"
+    repeats = int(args[5]) if len(args) > 5 else 5
+    filters = {
+        "current_from": current_from,
+        "current_to": current_to,
+        "previous_from": previous_from,
+        "previous_to": previous_to,
+        "group_by": group_by,
+    }
+
+    for name, function in (("single scan", period_comparison), ("two queries", naive_period_comparison)):
+        rows, timings = measure(function, filters, repeats)
+        print(
+            f"{name}: {rows} rows, median {statistics.median(timings) * 1000:.1f} ms, "
+            f"min {min(timings) * 1000:.1f} ms, max {max(timings) * 1000:.1f} ms ({repeats} runs)"
+        )
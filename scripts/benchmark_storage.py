@@ -0,0 +1,132 @@
+"""
+Compares storage layouts of money and quantity columns of cart items: double precision (before migration
+receipts 0008), NUMERIC with explicit scale (for reference) and integer minor units (current). Every layout
+is materialized as a copy of receipts_cartitem, then its size, buffer cache hit rate and duration of the
+aggregation used by analytics are measured. Sums are compared with the exact sums.
+
+Usage: python manage.py runscript benchmark_storage [--script-args <repeats> [<label>]]
+"""
+import json
+import os
+import statistics
+import time
+from decimal import Decimal
+
+from django.db import connection
+
+from receipts.models import MONEY_PLACES, QUANTITY_PLACES
+from scripts.benchmark_load import RESULTS_DIR, git_revision
+
+# column -> decimal places of its values (columns are stored in integer minor units)
+COLUMNS = {
+    "price": MONEY_PLACES,
+    "original_price": MONEY_PLACES,
+    "qty": QUANTITY_PLACES,
+    "total_price": MONEY_PLACES,
+    "margin_price_total": MONEY_PLACES,
+}
+
+AGGREGATED_COLUMNS = ("total_price", "qty", "margin_price_total")
+
+
+def unit(places):
+    return Decimal(1).scaleb(-places)
+
+
+# layout -> (expression of column converted from minor units, expression of sum in currency units)
+LAYOUTS = {
+    "double precision": (
+        lambda column, places: f"({column} * {unit(places)})::float8",
+        lambda column, places: f"SUM({column})",
+    ),
+    "numeric": (
+        lambda column, places: f"({column} * {unit(places)})::numeric(12, {places})",
+        lambda column, places: f"SUM({column})",
+    ),
+    "integer minor units": (
+        lambda column, places: column,
+        lambda column, places: f"SUM({column}) * {unit(places)}",
+    ),
+}
+
+TABLE = "benchmark_storage_cartitem"
+
+
+def measure_layout(cursor, column_expression, sum_expression, repeats):
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(
+        f"""
+        CREATE UNLOGGED TABLE {TABLE} AS
+        SELECT id, receipt_id, product_id, supplier_id, date,
+               {", ".join(f"{column_expression(column, places)} AS {column}" for column, places in COLUMNS.items())}
+        FROM receipts_cartitem
+        """
+    )
+    cursor.execute(f"VACUUM ANALYZE {TABLE}")
+    cursor.execute(
+        f"""
+        SELECT pg_relation_size('{TABLE}'), reltuples, (SELECT AVG(pg_column_size(t.*)) FROM {TABLE} t)
+        FROM pg_class WHERE relname = '{TABLE}'
+        """
+    )
+    size, rows, row_width = cursor.fetchone()
+
+    sums = ", ".join(f"{sum_expression(column, COLUMNS[column])} AS {column}" for column in AGGREGATED_COLUMNS)
+    query = f"SELECT product_id, {sums} FROM {TABLE} GROUP BY product_id"
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        cursor.execute(query)
+        cursor.fetchall()
+        timings.append(time.perf_counter() - start)
+
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}")
+    plan = cursor.fetchone()[0][0]["Plan"]
+    hit, read = plan["Shared Hit Blocks"], plan["Shared Read Blocks"]
+
+    cursor.execute(f"SELECT {sum_expression('total_price', MONEY_PLACES)} FROM {TABLE}")
+    total = cursor.fetchone()[0]
+    return {
+        "table_bytes": size,
+        "rows": int(rows),
+        "row_bytes": float(row_width or 0),
+        "aggregate_median_ms": statistics.median(timings) * 1000,
+        "cache_hit_rate": hit / (hit + read) if hit + read else None,
+        "total_price_sum": str(total),
+    }
+
+
+def run(*args):
+    repeats = int(args[0]) if args else 5
+    label = args[1] if len(args) > 1 else "storage"
+
+    results = {}
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW shared_buffers")
+        shared_buffers = cursor.fetchone()[0]
+        cursor.execute(f"SELECT SUM(total_price) * {unit(MONEY_PLACES)} FROM receipts_cartitem")
+        exact_total = cursor.fetchone()[0]
+        try:
+            for layout, (column_expression, sum_expression) in LAYOUTS.items():
+                results[layout] = measure_layout(cursor, column_expression, sum_expression, repeats)
+        finally:
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    print(f"shared_buffers: {shared_buffers}, exact SUM(total_price): {exact_total}")
+    for layout, result in results.items():
+        hit_rate = "n/a" if result["cache_hit_rate"] is None else f"{result['cache_hit_rate']:.2%}"
+        print(
+            f"{layout}: {result['table_bytes'] / 2 ** 20:.1f} MiB, {result['row_bytes']:.1f} bytes/row, "
+            f"aggregate {result['aggregate_median_ms']:.1f} ms, cache hit rate {hit_rate}, "
+            f"SUM(total_price) {result['total_price_sum']}"
+        )
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{label}.json")
+    with open(path, "w") as file:
+        json.dump(
+            {"label": label, "revision": git_revision(), "shared_buffers": shared_buffers, "layouts": results},
+            file,
+            indent=2,
+        )
+    print(f"results are stored in {path}")
@@ -1,9 +1,12 @@
-from products.models import Category, Producer, Product
-from receipts.models import CartItem, Receipt, Supplier, Terminal
+from products.models import Category, Producer, Product, ProductDim
+from receipts.models import (CartItem, DailySales, ProductAssociation, Receipt,
+                             Supplier, Terminal)
 from shops.models import Shop, ShopGroup
 
 
 def run():
+    DailySales.objects.all().delete()
+    ProductAssociation.objects.all().delete()
     CartItem.objects.all().delete()
     Receipt.objects.all().delete()
     Supplier.objects.all().delete()
@@ -18,6 +21,7 @@ def run():
                 print(e)
                 pass
 
+    ProductDim.objects.all().delete()
     Product.objects.all().delete()
     Producer.objects.all().delete()
 
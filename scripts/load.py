@@ -1,105 +1,306 @@
 """
 File is used to load data from csv files into database.
+
+Every file is streamed in chunks of at most LOAD_CHUNK_SIZE rows with explicit dtypes and only the known columns,
+so peak memory of the loader depends on the chunk size, not on the size of the files. Only sorted int64 arrays
+of ids of tables referenced by other tables (and parent links of trees) are kept for the whole load.
 """
+import io
+import json
 import os
+import resource
+import sys
+import time
 
 import numpy as np
 import pandas as pd
 import psycopg2.extras as extras
-from django.db import connection
+from django.core.management import call_command
+from django.core.management.base import OutputWrapper
+from django.db import connection, transaction
+from django.utils import timezone
 
 from datawiz_project.settings import BASE_DIR
+from datawiz_project.tenants import activate, get_tenant_schema
+from datawiz_project.versions import bump_table_versions, versioned_tables
+from products.models import ProductDim
+from receipts.models import DailySales
+from scripts.validation import (TABLE_SCHEMAS, broken_tree_references,
+                                clear_rejects, read_dtypes, referenced_tables,
+                                self_reference, validate_frame, write_rejects)
 
+DEFAULT_DATA_DIR = os.path.join(BASE_DIR, "scripts/csv_files")
 
-def run():
-    # app "products":
-    df_categories = pd.read_csv(os.path.join(BASE_DIR, "scripts/csv_files/category.csv")).sort_values("parent_id")
-    execute_addition(df_categories, "products_category")
+LOAD_CHUNK_SIZE = 50000
+
+
+def run(*args):
+    """
+    Usage: python manage.py runscript load [--script-args <data_dir> [<stats_file>] [tenant=<slug>]]
+    (directory with csv or parquet files, e.g. generated by "manage.py generate_dataset"; scripts/csv_files by default,
+    duration, rows and peak RSS of every step are written into stats_file as json; dataset is loaded into
+    the schema of the tenant, or into "public" schema if tenant is not given)
+    """
+    tenants = [arg.split("=", 1)[1] for arg in args if arg.startswith("tenant=")]
+    args = [arg for arg in args if not arg.startswith("tenant=")]
+    stdout = OutputWrapper(sys.stdout)
+    stats = load_dataset(args[0] if args else DEFAULT_DATA_DIR, tenant=tenants[0] if tenants else None, stdout=stdout)
+    stdout.write(f"peak RSS: {max(step['peak_rss_bytes'] for step in stats.values()) / 2 ** 20:.1f} MiB")
+    if len(args) > 1:
+        with open(args[1], "w") as file:
+            json.dump(stats, file, indent=2)
+
+
+def peak_rss():
+    """
+    Peak resident set size of the process in bytes. VmHWM is used on Linux, since ru_maxrss keeps the peak
+    of the parent process the loader was forked from.
+    """
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def load_dataset(data_dir, chunk_size=LOAD_CHUNK_SIZE, tenant=None, stdout=None):
+    """
+    Loads all files of data directory into database
+    :param tenant: slug of the tenant whose schema the dataset is loaded into ("public" schema if None)
+    :param stdout: output of the loader and of the commands it calls (sys.stdout if None)
+    :return: dict of step name -> {"rows": loaded rows (tables only), "seconds": duration,
+        "peak_rss_bytes": peak RSS of the process after the step}
+    """
+    stdout = stdout or OutputWrapper(sys.stdout)
+    if tenant is not None:
+        schema = get_tenant_schema(tenant)
+        if schema is None:
+            raise ValueError(f'tenant "{tenant}" does not exist, see "manage.py create_tenant"')
+        with activate(schema):
+            return load_dataset(data_dir, chunk_size, stdout=stdout)
 
-    df_producer = pd.read_csv(os.path.join(BASE_DIR, "scripts/csv_files/producer.csv")).sort_values("id")
-    execute_addition(df_producer, "products_producer")
+    # ids of rows that were loaded into tables referenced by other tables, used for foreign keys validation
+    loaded_ids = {}
+    stats = {}
 
-    df_products = pd.read_csv(os.path.join(BASE_DIR, "scripts/csv_files/product_edit.csv")).sort_values("id")
-    execute_addition(df_products, "products_product")
+    def timed(step, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        stats[step] = {"seconds": time.perf_counter() - start, "peak_rss_bytes": peak_rss()}
+        return result
+
+    def add_table(table, name):
+        rows = timed(table, load_table, table, data_file_path(data_dir, name), loaded_ids, chunk_size, stdout)
+        stats[table]["rows"] = rows
+
+    # app "products":
+    add_table("products_category", "category")
+    add_table("products_producer", "producer")
+    add_table("products_product", "product_edit")
 
     # app "shops":
-    df_shop_group = pd.read_csv(os.path.join(BASE_DIR, "scripts/csv_files/shop_group.csv")).sort_values("id")
-    execute_addition(df_shop_group, "shops_shopgroup")
+    add_table("shops_shopgroup", "shop_group")
+
+    # "left", "right" and "level" from csv files are not trusted, they are recomputed from "parent" links
+    timed("rebuild_nested_sets", call_command, "rebuild_nested_sets", stdout=stdout)
+    timed("refresh_product_dim", call_command, "refresh_product_dim", stdout=stdout)
 
-    df_shop = pd.read_csv(os.path.join(BASE_DIR, "scripts/csv_files/shop.csv")).sort_values("id")
-    execute_addition(df_shop, "shops_shop")
+    add_table("shops_shop", "shop")
 
     # app "receipts":
-    df_terminal = pd.read_csv(os.path.join(BASE_DIR, "scripts/csv_files/terminal.csv")).sort_values("id")
-    execute_addition(df_terminal, "receipts_terminal")
+    add_table("receipts_terminal", "terminal")
+    add_table("receipts_supplier", "supplier")
+    add_table("receipts_receipt", "receipt")
+    add_table("receipts_cartitem", "cartitem")
 
-    df_supplier = pd.read_csv(os.path.join(BASE_DIR, "scripts/csv_files/supplier.csv")).sort_values("id")
-    execute_addition(df_supplier, "receipts_supplier")
+    timed("refresh_daily_sales", call_command, "refresh_daily_sales", stdout=stdout)
+    timed("analyze", analyze_tables, [*TABLE_SCHEMAS, ProductDim._meta.db_table, DailySales._meta.db_table])
+    return stats
 
-    execute_additions_gradually("receipts_receipt", os.path.join(BASE_DIR, "scripts/csv_files/receipt.csv"))
 
-    execute_additions_gradually("receipts_cartitem", os.path.join(BASE_DIR, "scripts/csv_files/cartitem.csv"))
+def analyze_tables(tables):
+    """
+    Planner statistics of loaded tables (of the current schema only) are collected right away instead of
+    waiting for autovacuum
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {', '.join(tables)}")
 
 
-def execute_addition(df, table):
-    df = df.astype(object).replace(np.nan, None)  # replace all nan with None
-    tuples = [tuple(x) for x in df.to_numpy()]
-    tuples_for_update = []  # variable only when inserting into 'products_category'
+def data_file_path(data_dir, name):
+    """
+    Returns path of csv or parquet file with given name (csv is preferred when both exist)
+    """
+    for extension in ("csv", "parquet"):
+        path = os.path.join(data_dir, f"{name}.{extension}")
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"{name}.csv or {name}.parquet is not found in {data_dir}")
 
-    # if we are inserting data from categories.csv, we should firstly add it without 'parent_id'
-    # and only after inserting all data we should update column 'parent_id' with existing values
-    if table == "products_category":
-        tuples_for_update = []
-        for tup in tuples:
-            tuples_for_update.append((tup[0], tup[2]))
-        df = df.assign(parent_id=None)
-        tuples = [tuple(x) for x in df.to_numpy()]
 
-    cols = '"' + '","'.join(list(df.columns)) + '"'
+def read_chunks(file_path, table, chunk_size):
+    """
+    Iterates over data frames of at most chunk_size rows of csv or parquet file, only columns of the table schema
+    are read, with dtypes of scripts.validation.READ_DTYPES
+    """
+    columns = TABLE_SCHEMAS[table]["columns"]
+    if file_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
 
-    # SQL query to execute
-    query = f"INSERT INTO {table}({cols}) VALUES %s"
+        parquet_file = pq.ParquetFile(file_path)
+        names = [name for name in parquet_file.schema_arrow.names if name in columns]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=names):
+            yield batch.to_pandas()
+        return
 
+    rows = 0
     try:
-        with connection.cursor() as cursor:
-            extras.execute_values(cursor, query, tuples)
-    except Exception as error:
-        print(f"Error: {error}")
-        return 1
-
-    # if this is 'products_category' table, we are updating 'parent_id' after inserting values
-    if table == "products_category":
-        update_query = """
-            UPDATE products_category
-            SET parent_id = data.parent_id
-            FROM (VALUES %s) AS data (id, parent_id)
-            WHERE products_category.id = data.id
-        """
-        with connection.cursor() as cursor:
-            extras.execute_values(cursor, update_query, tuples_for_update)
-
-    print(f"the dataframe is inserted into {table}")
-
-
-def execute_additions_gradually(table, file_path, chunk_size=50000):
-    """
-    For gradual inserting records into database
-    :param table:
-    :param file_path:
-    :param chunk_size:
-    :return:
+        for chunk in pd.read_csv(
+            file_path, chunksize=chunk_size, usecols=lambda name: name in columns, dtype=read_dtypes(table)
+        ):
+            rows += len(chunk)
+            yield chunk
+    except (ValueError, TypeError):
+        # file contains values that do not fit their dtype: the rest of it is read as text, such values
+        # are rejected by validation
+        for chunk in pd.read_csv(
+            file_path,
+            chunksize=chunk_size,
+            usecols=lambda name: name in columns,
+            dtype=str,
+            skiprows=lambda line: 0 < line <= rows,
+        ):
+            yield chunk
+
+
+def copy_frame(cursor, df, table):
     """
-    try:
-        with connection.cursor() as cursor:
-            # read from file only 50 000 records on each iteration
-            for chunk in pd.read_csv(file_path, chunksize=chunk_size):
-                df = chunk.astype(object).replace(np.nan, None)  # replace all nan with None
-                tuples = [tuple(x) for x in df.to_numpy()]
-
-                cols = '"' + '","'.join(list(df.columns)) + '"'
-                query = f"INSERT INTO {table}({cols}) VALUES %s"
-                extras.execute_values(cursor, query, tuples)
-    except Exception as error:
-        print(f"Error: {error}")
-        return 1
-    print(f"dataframe is inserted into {table}")
+    Inserts data frame into table with COPY (nullable values are written as empty csv fields)
+    """
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    cols = '"' + '","'.join(list(df.columns)) + '"'
+    cursor.copy_expert(f"COPY {table}({cols}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def reset_sequence(cursor, table):
+    """
+    Rows are copied with explicit ids, so id sequence has to be moved past them for rows created by the API
+    """
+    cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}")
+
+
+def link_tree_nodes(cursor, table, parent_column, file_path, ids, parents, chunk_size):
+    """
+    Tree nodes are copied without parents (parent can be in a later chunk), after all nodes are loaded nodes
+    with broken parent references (missing parents or cycles) are deleted and rejected, and parents of the rest
+    are set
+    :return: ids of nodes that are left
+    """
+    missing, cycle = broken_tree_references(ids, parents)
+    broken = missing | cycle
+    if broken.any():
+        order = np.argsort(ids[broken])
+        broken_ids = ids[broken][order]
+        reasons = np.where(missing, f"{parent_column}:missing_reference", f"{parent_column}:cycle")[broken][order]
+        cursor.execute(f"DELETE FROM {table} WHERE id = ANY(%s)", [broken_ids.tolist()])
+        # raw rows of rejected nodes are read once more, so that reject file has the same format for all rejects
+        for chunk in read_chunks(file_path, table, chunk_size):
+            chunk_ids = pd.to_numeric(chunk["id"], errors="coerce").to_numpy()
+            is_broken = np.isin(chunk_ids, broken_ids)
+            rejected = chunk.loc[is_broken].copy()
+            rejected["reject_reason"] = reasons[np.searchsorted(broken_ids, chunk_ids[is_broken])]
+            write_rejects(rejected, table)
+
+    linked = ~broken & ~np.isnan(parents)
+    # linked nodes are stamped again, so that delta sync ("modified_since") delivers their parents
+    update_query = f"""
+        UPDATE {table}
+        SET {parent_column} = data.parent_id, updated_at = NOW()
+        FROM (VALUES %s) AS data (id, parent_id)
+        WHERE {table}.id = data.id AND {table}.{parent_column} IS DISTINCT FROM data.parent_id
+    """
+    extras.execute_values(
+        cursor,
+        update_query,
+        zip(ids[linked].tolist(), parents[linked].astype("int64").tolist()),
+        page_size=chunk_size,
+    )
+    return ids[~broken]
+
+
+def load_table(table, file_path, loaded_ids, chunk_size=LOAD_CHUNK_SIZE, stdout=None):
+    """
+    Streams file into table: every chunk is validated (rejected rows are appended to the reject file)
+    and copied into the table
+    :param loaded_ids: ids of already loaded tables, ids of this table are added after loading if other
+        tables reference it
+    :param stdout: output of the progress (sys.stdout if None)
+    :return: number of loaded rows
+    """
+    stdout = stdout or OutputWrapper(sys.stdout)
+    clear_rejects(table)
+    parent_column = self_reference(table)
+    # ids of every chunk are kept while the table is loaded, so that ids repeated in later chunks are rejected
+    # instead of failing COPY of the whole chunk; after the load they are kept only if other tables reference them
+    track_ids = "id" in TABLE_SCHEMAS[table]["columns"]
+    keep_ids = table in referenced_tables() or parent_column is not None
+    is_versioned = table in versioned_tables()
+    updated_at = timezone.now()
+
+    chunk_ids, chunk_parents = [], []
+    # sorted ids of previous chunks and ids of chunks that are not merged into them yet
+    seen_ids, new_ids = np.empty(0, dtype="int64"), []
+    max_id = -np.inf
+    loaded = rejected_count = 0
+    # a table that fails is rolled back as a whole and the error stops the load, so that tables referencing it
+    # are not validated against ids that were never loaded
+    with transaction.atomic(), connection.cursor() as cursor:
+        for chunk in read_chunks(file_path, table, chunk_size):
+            overlapping = None
+            # ids usually grow, previous ids are searched only when the chunk overlaps them
+            if track_ids and max_id >= pd.to_numeric(chunk["id"], errors="coerce").min():
+                seen_ids, new_ids = np.sort(np.concatenate([seen_ids, *new_ids])), []
+                overlapping = seen_ids
+            df, rejected = validate_frame(chunk, table, loaded_ids, overlapping)
+            write_rejects(rejected, table)
+            rejected_count += len(rejected)
+
+            if track_ids and len(df):
+                new_ids.append(df["id"].to_numpy(dtype="int64"))
+                max_id = max(max_id, new_ids[-1].max())
+            if keep_ids and len(df):
+                chunk_ids.append(new_ids[-1])
+            if parent_column:
+                chunk_parents.append(df[parent_column].to_numpy(dtype="float64", na_value=np.nan))
+                df = df.assign(**{parent_column: pd.NA})
+            if is_versioned:
+                df = df.assign(updated_at=updated_at)
+
+            copy_frame(cursor, df, table)
+            loaded += len(df)
+
+        ids = np.concatenate(chunk_ids) if chunk_ids else np.empty(0, dtype="int64")
+        if parent_column:
+            parents = np.concatenate(chunk_parents) if chunk_parents else np.empty(0)
+            left = link_tree_nodes(cursor, table, parent_column, file_path, ids, parents, chunk_size)
+            rejected_count += len(ids) - len(left)
+            loaded -= len(ids) - len(left)
+            ids = left
+        reset_sequence(cursor, table)
+
+    if keep_ids:
+        loaded_ids[table] = np.sort(ids)
+    # cached catalogue responses of terminals have to be invalidated
+    if is_versioned:
+        bump_table_versions(table)
+
+    stdout.write(
+        f"{loaded} rows are inserted into {table} ({rejected_count} rejected), peak RSS {peak_rss() / 2 ** 20:.1f} MiB"
+    )
+    return loaded
@@ -0,0 +1,308 @@
+"""
+Seeded generator of synthetic datasets in the format of the loader input files (see scripts/load.py).
+
+The same seed and parameters always produce the same files, so performance numbers measured on them
+can be reproduced by anyone.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from datawiz_project.nested_sets import compute_nested_sets
+
+FORMATS = ("csv", "parquet")
+
+# average number of cart items in one receipt is 1 + RECEIPT_EXTRA_ITEMS
+RECEIPT_EXTRA_ITEMS = 4
+
+# relative number of receipts in every hour of the day (shops are closed at night)
+HOURLY_TRAFFIC = np.array([0, 0, 0, 0, 0, 0, 1, 3, 6, 7, 7, 8, 9, 8, 7, 7, 8, 10, 12, 11, 8, 5, 2, 1], dtype="float64")
+
+MANIFEST_FILE = "dataset.json"
+
+
+class TableWriter:
+    """
+    Appends data frames to one csv or parquet file, header (or schema) is written only once
+    """
+
+    def __init__(self, path, file_format):
+        self.path = path
+        self.file_format = file_format
+        self.rows = 0
+        self._parquet_writer = None
+        if os.path.exists(path):
+            os.remove(path)
+
+    def write(self, df):
+        if self.file_format == "csv":
+            df.to_csv(self.path, mode="a", header=not self.rows, index=False, date_format="%Y-%m-%d %H:%M:%S")
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def generate_tree(rng, prefix, roots, depth, fanout):
+    """
+    Generates forest with random number of children (0 .. 2 * fanout - 1) of every node below the roots
+    (roots always have at least one child), ids are assigned breadth first
+    :return: data frame with id, name, parent_id, left, right, level (consistent nested sets)
+    """
+    ids = [np.arange(1, roots + 1)]
+    parents = [np.full(roots, -1)]
+    current = ids[0]
+    for level in range(1, depth):
+        counts = rng.integers(1 if level == 1 else 0, 2 * fanout, size=len(current))
+        if not counts.sum():
+            break
+        children = np.arange(ids[-1][-1] + 1, ids[-1][-1] + 1 + counts.sum())
+        ids.append(children)
+        parents.append(np.repeat(current, counts))
+        current = children
+
+    ids, parents = np.concatenate(ids), np.concatenate(parents)
+    values, _ = compute_nested_sets(
+        (node_id, parent_id if parent_id > 0 else None) for node_id, parent_id in zip(ids.tolist(), parents.tolist())
+    )
+    left, right, level = (np.array(column) for column in zip(*(values[node_id] for node_id in ids.tolist())))
+    return pd.DataFrame(
+        {
+            "id": ids,
+            "name": [f"{prefix}{node_id}" for node_id in ids.tolist()],
+            "parent_id": pd.Series(parents).where(parents > 0).astype("Int64"),
+            "left": left,
+            "right": right,
+            "level": level,
+        }
+    )
+
+
+def leaf_ids(tree):
+    return tree.loc[~tree["id"].isin(tree["parent_id"].dropna()), "id"].to_numpy()
+
+
+def weighted_choice(rng, cumulative_weights, size):
+    """
+    Vectorized sampling of indexes with probabilities given by cumulative weights (normalized to 1)
+    """
+    return np.minimum(np.searchsorted(cumulative_weights, rng.random(size)), len(cumulative_weights) - 1)
+
+
+def cumulative(weights):
+    weights = np.cumsum(weights, dtype="float64")
+    return weights / weights[-1]
+
+
+def default_scale(cart_items):
+    """
+    Sizes of dimension tables which keep proportions of a retail chain for the given number of cart items
+    """
+    products = int(np.clip(cart_items // 1000, 300, 100_000))
+    return {
+        "products": products,
+        "producers": max(10, products // 50),
+        "suppliers": max(5, products // 200),
+        "shops": int(np.clip(cart_items // 200_000, 8, 5_000)),
+    }
+
+
+def generate_dataset(
+    output_dir,
+    cart_items,
+    seed=0,
+    file_format="csv",
+    start_date="2023-01-01",
+    days=365,
+    category_depth=5,
+    category_fanout=4,
+    shop_group_depth=4,
+    shop_group_fanout=3,
+    chunk_size=1_000_000,
+    **scale,
+):
+    """
+    Writes all loader input files of a synthetic dataset into output_dir
+    :param cart_items: exact number of cart items to generate
+    :param scale: overrides of default_scale() ("products", "producers", "suppliers", "shops")
+    :return: manifest (parameters and row counts of every file), also stored in output_dir
+    """
+    rng = np.random.default_rng(seed)
+    scale = {**default_scale(cart_items), **{key: value for key, value in scale.items() if value}}
+    os.makedirs(output_dir, exist_ok=True)
+    rows = {}
+
+    def write_table(name, df):
+        with TableWriter(os.path.join(output_dir, f"{name}.{file_format}"), file_format) as writer:
+            writer.write(df)
+        rows[name] = len(df)
+
+    # app "products":
+    categories = generate_tree(rng, "cat", max(2, category_fanout), category_depth, category_fanout)
+    write_table("category", categories)
+
+    producer_ids = np.arange(1, scale["producers"] + 1)
+    write_table("producer", pd.DataFrame({"id": producer_ids, "name": [f"producer{i}" for i in producer_ids]}))
+
+    product_ids = np.arange(1, scale["products"] + 1)
+    has_producer = rng.random(len(product_ids)) > 0.05
+    write_table(
+        "product_edit",
+        pd.DataFrame(
+            {
+                "id": product_ids,
+                "name": [f"product{i}" for i in product_ids],
+                "category_id": rng.choice(leaf_ids(categories), len(product_ids)),
+                "producer_id": pd.Series(rng.choice(producer_ids, len(product_ids)))
+                .where(has_producer)
+                .astype("Int64"),
+                "article": [f"a{i}" for i in product_ids],
+                "barcode": rng.integers(10**12, 10**13, len(product_ids)).astype(str),
+            }
+        ),
+    )
+
+    # app "shops":
+    shop_groups = generate_tree(rng, "group", 2, shop_group_depth, shop_group_fanout)
+    write_table("shop_group", shop_groups)
+
+    shop_ids = np.arange(1, scale["shops"] + 1)
+    write_table(
+        "shop",
+        pd.DataFrame(
+            {
+                "id": shop_ids,
+                "name": [f"shop{i}" for i in shop_ids],
+                "group_id": rng.choice(leaf_ids(shop_groups), len(shop_ids)),
+            }
+        ),
+    )
+
+    # app "receipts": terminals are numbered shop by shop, so terminals of a shop form a contiguous id range
+    terminals_per_shop = rng.integers(1, 9, len(shop_ids))
+    terminal_offsets = np.cumsum(terminals_per_shop) - terminals_per_shop
+    terminal_ids = np.arange(1, terminals_per_shop.sum() + 1)
+    write_table(
+        "terminal",
+        pd.DataFrame(
+            {
+                "id": terminal_ids,
+                "name": [f"terminal{i}" for i in terminal_ids],
+                "shop_id": np.repeat(shop_ids, terminals_per_shop),
+            }
+        ),
+    )
+
+    supplier_ids = np.arange(1, scale["suppliers"] + 1)
+    write_table("supplier", pd.DataFrame({"id": supplier_ids, "name": [f"supplier{i}" for i in supplier_ids]}))
+
+    # product properties which are stable across receipts; popularity follows Zipf's law
+    base_prices = np.maximum(np.round(rng.lognormal(np.log(60), 0.9, len(product_ids)), 2), 0.5)
+    margin_rates = rng.uniform(0.05, 0.35, len(product_ids))
+    sold_by_weight = rng.random(len(product_ids)) < 0.2
+    product_suppliers = rng.choice(supplier_ids, len(product_ids))
+    product_popularity = cumulative(rng.permutation(1 / np.arange(1, len(product_ids) + 1) ** 1.07))
+    shop_traffic = cumulative(rng.lognormal(0, 0.7, len(shop_ids)))
+    hourly_traffic = cumulative(HOURLY_TRAFFIC)
+
+    start = np.datetime64(start_date, "s")
+    expected_receipts = max(1, cart_items // (1 + RECEIPT_EXTRA_ITEMS))
+    receipt_id, item_id = 1, 1
+
+    with TableWriter(os.path.join(output_dir, f"receipt.{file_format}"), file_format) as receipt_writer, TableWriter(
+        os.path.join(output_dir, f"cartitem.{file_format}"), file_format
+    ) as item_writer:
+        while item_writer.rows < cart_items:
+            items_per_receipt = 1 + rng.poisson(RECEIPT_EXTRA_ITEMS, max(1, chunk_size // (1 + RECEIPT_EXTRA_ITEMS)))
+            # the last receipt is cut so that exactly cart_items rows are generated
+            remaining = cart_items - item_writer.rows
+            total = np.cumsum(items_per_receipt)
+            if total[-1] >= remaining:
+                last = np.searchsorted(total, remaining)
+                items_per_receipt = items_per_receipt[: last + 1]
+                items_per_receipt[-1] -= total[last] - remaining
+
+            count = len(items_per_receipt)
+            receipt_ids = np.arange(receipt_id, receipt_id + count)
+            shops = weighted_choice(rng, shop_traffic, count)
+            terminals = terminal_ids[terminal_offsets[shops] + rng.integers(0, terminals_per_shop[shops])]
+            # receipts are spread evenly over the period, ids grow together with dates
+            day = np.minimum((receipt_ids - 1) * days // expected_receipts, days - 1)
+            seconds = day * 86400 + weighted_choice(rng, hourly_traffic, count) * 3600 + rng.integers(0, 60, count) * 60
+            dates = start + np.sort(seconds).astype("timedelta64[s]")
+            receipt_writer.write(
+                pd.DataFrame({"id": receipt_ids, "date": dates, "shop_id": shop_ids[shops], "terminal_id": terminals})
+            )
+
+            size = int(items_per_receipt.sum())
+            products = weighted_choice(rng, product_popularity, size)
+            original_prices = base_prices[products]
+            discounted = rng.random(size) < 0.12
+            prices = np.where(
+                discounted, np.round(original_prices * (1 - rng.uniform(0.05, 0.3, size)), 2), original_prices
+            )
+            pieces = np.where(rng.random(size) < 0.85, 1, rng.integers(2, 6, size))
+            qty = np.where(sold_by_weight[products], np.round(rng.uniform(0.1, 2.5, size), 3), pieces)
+            total_prices = np.round(prices * qty, 2)
+            item_writer.write(
+                pd.DataFrame(
+                    {
+                        "id": np.arange(item_id, item_id + size),
+                        "receipt_id": np.repeat(receipt_ids, items_per_receipt),
+                        "product_id": product_ids[products],
+                        "supplier_id": product_suppliers[products],
+                        "date": np.repeat(dates, items_per_receipt),
+                        "price": prices,
+                        "original_price": original_prices,
+                        "qty": qty.astype("float64"),
+                        "total_price": total_prices,
+                        "margin_price_total": np.round(total_prices * margin_rates[products], 2),
+                    }
+                )
+            )
+            receipt_id += count
+            item_id += size
+        rows["receipt"], rows["cartitem"] = receipt_writer.rows, item_writer.rows
+
+    manifest = {
+        "seed": seed,
+        "format": file_format,
+        "cart_items": cart_items,
+        "start_date": start_date,
+        "days": days,
+        "category_depth": category_depth,
+        "category_fanout": category_fanout,
+        "shop_group_depth": shop_group_depth,
+        "shop_group_fanout": shop_group_fanout,
+        "scale": scale,
+        "chunk_size": chunk_size,
+        "rows": rows,
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def read_manifest(data_dir):
+    path = os.path.join(data_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
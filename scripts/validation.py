@@ -0,0 +1,286 @@
+"""
+Vectorized validation of the loader data frames before they are copied into the database.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from datawiz_project.fields import MAX_MINOR_UNITS
+from datawiz_project.settings import BASE_DIR
+from receipts.models import MONEY_PLACES, QUANTITY_PLACES
+
+REJECTS_DIR = os.path.join(BASE_DIR, "scripts/rejects")
+
+# absolute tolerance (in currency units) for "total_price ≈ price * qty"
+TOTAL_PRICE_TOLERANCE = 0.01
+
+# scaled values are rounded to this number of decimal places before rounding to minor units, which removes
+# the binary error of floats (2.675 is read as 2.67499999...), values of integer columns stay far below 2 ** 53
+FLOAT_ERROR_PLACES = 6
+
+# "columns" maps every known column to its kind ("int", "float", "str" or "datetime"),
+# "foreign_keys" maps column to the table whose loaded ids it must reference,
+# "minor_units" maps float column to the number of decimal places kept in its integer column
+TABLE_SCHEMAS = {
+    "products_category": {
+        "columns": {"id": "int", "name": "str", "parent_id": "int", "left": "int", "right": "int", "level": "int"},
+        "nullable": ("parent_id",),
+        "foreign_keys": {"parent_id": "products_category"},
+    },
+    "products_producer": {
+        "columns": {"id": "int", "name": "str"},
+    },
+    "products_product": {
+        "columns": {
+            "id": "int",
+            "name": "str",
+            "category_id": "int",
+            "producer_id": "int",
+            "article": "str",
+            "barcode": "str",
+        },
+        "nullable": ("producer_id", "article", "barcode"),
+        "foreign_keys": {"category_id": "products_category", "producer_id": "products_producer"},
+    },
+    "shops_shopgroup": {
+        "columns": {"id": "int", "name": "str", "parent_id": "int", "left": "int", "right": "int", "level": "int"},
+        "nullable": ("parent_id",),
+        "foreign_keys": {"parent_id": "shops_shopgroup"},
+    },
+    "shops_shop": {
+        "columns": {"id": "int", "name": "str", "group_id": "int"},
+        "foreign_keys": {"group_id": "shops_shopgroup"},
+    },
+    "receipts_terminal": {
+        "columns": {"id": "int", "name": "str", "shop_id": "int"},
+        "foreign_keys": {"shop_id": "shops_shop"},
+    },
+    "receipts_supplier": {
+        "columns": {"id": "int", "name": "str"},
+    },
+    "receipts_receipt": {
+        "columns": {"id": "int", "date": "datetime", "shop_id": "int", "terminal_id": "int", "external_id": "str"},
+        "nullable": ("external_id",),
+        "foreign_keys": {"shop_id": "shops_shop", "terminal_id": "receipts_terminal"},
+    },
+    "receipts_cartitem": {
+        "columns": {
+            "id": "int",
+            "receipt_id": "int",
+            "product_id": "int",
+            "supplier_id": "int",
+            "date": "datetime",
+            "price": "float",
+            "original_price": "float",
+            "qty": "float",
+            "total_price": "float",
+            "margin_price_total": "float",
+        },
+        "foreign_keys": {
+            "receipt_id": "receipts_receipt",
+            "product_id": "products_product",
+            "supplier_id": "receipts_supplier",
+        },
+        "non_negative": ("price", "original_price", "qty"),
+        "total_price": True,
+        "minor_units": {
+            "price": MONEY_PLACES,
+            "original_price": MONEY_PLACES,
+            "qty": QUANTITY_PLACES,
+            "total_price": MONEY_PLACES,
+            "margin_price_total": MONEY_PLACES,
+        },
+    },
+}
+
+
+# dtype every column kind is read with: numbers are read as float64 (ids fit exactly, missing values are NaN),
+# timestamps as category, since cart items of one receipt repeat its timestamp, so each distinct value
+# is parsed only once
+READ_DTYPES = {"int": "float64", "float": "float64", "str": "str", "datetime": "category"}
+
+
+def read_dtypes(table):
+    """
+    :return: dict of column -> dtype the loader input file of the table is read with
+    """
+    return {column: READ_DTYPES[kind] for column, kind in TABLE_SCHEMAS[table]["columns"].items()}
+
+
+def self_reference(table):
+    """
+    :return: column referencing the same table (parent of tree node) or None
+    """
+    return next(
+        (column for column, target in TABLE_SCHEMAS[table].get("foreign_keys", {}).items() if target == table), None
+    )
+
+
+def referenced_tables():
+    return {target for schema in TABLE_SCHEMAS.values() for target in schema.get("foreign_keys", {}).values()}
+
+
+def contains(sorted_ids, values):
+    """
+    Vectorized membership test of values in sorted array of ids
+    :param sorted_ids: sorted numpy array of known ids
+    :param values: numpy array of ids to check
+    :return: boolean numpy array
+    """
+    if not len(sorted_ids):
+        return np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_ids, values), len(sorted_ids) - 1)
+    return sorted_ids[positions] == values
+
+
+def coerce_column(raw, kind):
+    """
+    Converts column to its kind and returns it together with mask of values that could not be converted
+    """
+    missing = raw.isna()
+    if kind == "str":
+        return raw, np.zeros(len(raw), dtype=bool)
+    if kind == "datetime":
+        if isinstance(raw.dtype, pd.CategoricalDtype):
+            parsed = pd.to_datetime(pd.Series(raw.cat.categories), errors="coerce", utc=True, format="mixed")
+            codes = raw.cat.codes.to_numpy()
+            converted = pd.Series(
+                pd.DatetimeIndex(parsed).take(codes, allow_fill=True, fill_value=pd.NaT), index=raw.index
+            )
+        else:
+            converted = pd.to_datetime(raw, errors="coerce", utc=True, format="mixed")
+        return converted, (converted.isna() & ~missing).to_numpy()
+
+    converted = pd.to_numeric(raw, errors="coerce")
+    invalid = converted.isna() & ~missing
+    if kind == "int":
+        invalid |= converted.notna() & (converted != np.floor(converted))
+    return converted.astype("float64"), invalid.to_numpy()
+
+
+def to_minor_units(values, places):
+    """
+    Converts float series to integral numbers of minor units, half is rounded away from zero like
+    datawiz_project.fields.to_minor_units and numeric ROUND() of PostgreSQL do
+    """
+    scaled = (values * 10**places).round(FLOAT_ERROR_PLACES)
+    return np.sign(scaled) * np.floor(scaled.abs() + 0.5)
+
+
+def validate_frame(df, table, loaded_ids, seen_ids=None):
+    """
+    Splits data frame into rows that are safe to insert and rejected rows. References of tree nodes to their
+    parents are not checked here, since parent can be in another chunk (see broken_tree_references())
+    :param df: data frame read from csv file
+    :param table: name of the table data frame is going to be inserted into
+    :param loaded_ids: dict of table name -> sorted numpy array of ids that are already loaded
+    :param seen_ids: sorted numpy array of ids of previous chunks of the same file
+    :return: (valid data frame with converted dtypes, rejected raw rows with "reject_reason" column)
+    """
+    schema = TABLE_SCHEMAS[table]
+    nullable = schema.get("nullable", ())
+    errors = {}
+    converted = {}
+
+    for column, kind in schema["columns"].items():
+        if column not in df:
+            continue
+        converted[column], errors[f"{column}:type"] = coerce_column(df[column], kind)
+        if column not in nullable:
+            errors[f"{column}:null"] = df[column].isna().to_numpy()
+
+    if "id" in converted:
+        errors["id:duplicate"] = converted["id"].duplicated(keep="first").to_numpy()
+        if seen_ids is not None:
+            errors["id:duplicate"] = errors["id:duplicate"] | contains(seen_ids, converted["id"].to_numpy())
+
+    for column in schema.get("non_negative", ()):
+        if column in converted:
+            errors[f"{column}:negative"] = (converted[column] < 0).to_numpy()
+
+    if schema.get("total_price") and {"total_price", "price", "qty"} <= converted.keys():
+        expected = converted["price"].to_numpy() * converted["qty"].to_numpy()
+        total = converted["total_price"].to_numpy()
+        mismatch = ~np.isclose(total, expected, rtol=0, atol=TOTAL_PRICE_TOLERANCE)
+        errors["total_price:mismatch"] = mismatch & ~np.isnan(total)
+
+    # values are copied as integer minor units (e.g. cents), they have to fit into integer column
+    for column, places in schema.get("minor_units", {}).items():
+        if column in converted:
+            converted[column] = to_minor_units(converted[column], places)
+            errors[f"{column}:out_of_range"] = (converted[column].abs() > MAX_MINOR_UNITS).to_numpy()
+
+    errors = pd.DataFrame(errors, index=df.index)
+    invalid = errors.any(axis=1).to_numpy(copy=True)
+
+    for column, referenced_table in schema.get("foreign_keys", {}).items():
+        if column not in converted or referenced_table == table:
+            continue
+        values = converted[column].to_numpy()
+        broken = ~np.isnan(values) & ~contains(loaded_ids.get(referenced_table, np.empty(0)), values)
+        errors[f"{column}:missing_reference"] = broken
+        invalid |= broken
+
+    rejected = df.loc[invalid].copy()
+    rejected["reject_reason"] = errors.loc[invalid].dot(errors.columns + ";").str.rstrip(";")
+
+    valid = pd.DataFrame({column: converted.get(column, df[column]) for column in df.columns}, index=df.index)
+    valid = valid.loc[~invalid]
+    for column, kind in schema["columns"].items():
+        if column in valid and (kind == "int" or column in schema.get("minor_units", {})):
+            valid[column] = valid[column].astype("Int64")
+    return valid, rejected
+
+
+def broken_tree_references(ids, parents):
+    """
+    Parent of tree node must be a valid node of the same table and every node must be reachable from a root,
+    so rejection of a parent cascades to all of its descendants
+    :param ids: numpy array of ids of valid nodes
+    :param parents: numpy array of their parent ids (NaN for roots)
+    :return: (boolean numpy array of nodes whose parent or ancestor is missing, boolean numpy array of nodes
+        that are parts of parent cycles or their descendants)
+    """
+    present = ~np.isnan(parents)
+    missing = np.zeros(len(ids), dtype=bool)
+    while True:
+        valid_ids = np.sort(ids[~missing])
+        newly_missing = present & ~missing & ~contains(valid_ids, parents)
+        if not newly_missing.any():
+            break
+        missing |= newly_missing
+
+    # nodes are reached from roots level by level, nodes that are never reached have a cycle among their ancestors
+    reachable = ~present & ~missing
+    while True:
+        newly_reachable = present & ~missing & ~reachable & contains(np.sort(ids[reachable]), parents)
+        if not newly_reachable.any():
+            return missing, ~missing & ~reachable
+        reachable |= newly_reachable
+
+
+def reject_file_path(table):
+    return os.path.join(REJECTS_DIR, f"{table}.csv")
+
+
+def clear_rejects(table):
+    if os.path.exists(reject_file_path(table)):
+        os.remove(reject_file_path(table))
+
+
+def write_rejects(rejected, table):
+    """
+    Appends rejected rows to the reject file of the table (header is written only once)
+    """
+    if rejected.empty:
+        return
+    # integer columns are read as float64, integral values are written back without fractional part
+    for column, kind in TABLE_SCHEMAS[table]["columns"].items():
+        if kind == "int" and column in rejected and rejected[column].dtype == "float64":
+            values = rejected[column]
+            if (values.dropna() % 1 == 0).all():
+                rejected = rejected.assign(**{column: values.astype("Int64")})
+    os.makedirs(REJECTS_DIR, exist_ok=True)
+    path = reject_file_path(table)
+    rejected.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
@@ -12,7 +12,7 @@ class ShopFilter(FilterSet):
 
     class Meta:
         model = Shop
-        fields = "__all__"
+        exclude = ["updated_at"]
 
 
 class ShopGroupFilter(FilterSet):
@@ -32,4 +32,4 @@ class ShopGroupFilter(FilterSet):
 
     class Meta:
         model = ShopGroup
-        fields = "__all__"
+        exclude = ["updated_at"]
@@ -7,8 +7,10 @@ class ShopGroup(models.Model):
     left = models.BigIntegerField()
     right = models.BigIntegerField()
     level = models.BigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
 
 class Shop(models.Model):
     name = models.CharField(max_length=255)
     group = models.ForeignKey(ShopGroup, on_delete=models.PROTECT)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
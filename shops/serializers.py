@@ -1,5 +1,7 @@
 from rest_framework.serializers import ModelSerializer
 
+from datawiz_project.serializers import DynamicFieldsModelSerializer
+
 from .models import Shop, ShopGroup
 
 
@@ -9,7 +11,7 @@ class ShopGroupDisplaySerializer(ModelSerializer):
         fields = ["id", "name"]
 
 
-class ShopSerializer(ModelSerializer):
+class ShopSerializer(DynamicFieldsModelSerializer):
     group = ShopGroupDisplaySerializer()
 
     class Meta:
@@ -17,7 +19,7 @@ class ShopSerializer(ModelSerializer):
         fields = "__all__"
 
 
-class ShopGroupSerializer(ModelSerializer):
+class ShopGroupSerializer(DynamicFieldsModelSerializer):
     parent = ShopGroupDisplaySerializer()
 
     class Meta: